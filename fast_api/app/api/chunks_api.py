@@ -1,25 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 import uuid
-from typing import List
+from dataclasses import asdict
+from typing import List, Optional
 from app.core.database import get_db
 from app.core.models import EDFFile
-from app.core.chunks import chunk_manager
-from app.core.schemas import EEGChunksSummaryResponse, EEGChunksResponse, EEGChunkInfo
+from app.core.chunks import ChunkInfo, chunk_manager
+from app.core.executor import eeg_executor
+from app.core.pyramid import group_envelope, interleave
+from app.core.sample_stream import SampleStreamEncoder
+from app.core.schemas import EEGChunksSummaryResponse, EEGChunksResponse, EEGChunkInfo, EEGChunkEnvelopeResponse
 
 router = APIRouter(prefix="/chunks", tags=["chunks"])
 
+async def _get_edf_file(db: Session, edf_file_id: uuid.UUID):
+    # Sessão síncrona do SQLAlchemy: consulta fora do event loop
+    return await run_in_threadpool(lambda: db.query(EDFFile).filter(EDFFile.id == edf_file_id).first())
+
 @router.get("/edf/{edf_file_id}/summary", response_model=EEGChunksSummaryResponse)
 async def get_edf_chunks_summary(
     edf_file_id: uuid.UUID,
     db: Session = Depends(get_db)
 ):
-    edf_file = db.query(EDFFile).filter(EDFFile.id == edf_file_id).first()
+    edf_file = await _get_edf_file(db, edf_file_id)
     if not edf_file:
         raise HTTPException(status_code=404, detail="Arquivo EDF não encontrado")
     
     try:
-        edf_info = chunk_manager.read_edf_info(edf_file.file_path)
+        edf_info = await eeg_executor.run("read", chunk_manager.read_edf_info, edf_file.file_path)
         chunks = chunk_manager.calculate_chunks(edf_info['duration'])
         
         return EEGChunksSummaryResponse(
@@ -36,12 +46,12 @@ async def get_specific_chunk(
     chunk_index: int,
     db: Session = Depends(get_db)
 ):
-    edf_file = db.query(EDFFile).filter(EDFFile.id == edf_file_id).first()
+    edf_file = await _get_edf_file(db, edf_file_id)
     if not edf_file:
         raise HTTPException(status_code=404, detail="Arquivo EDF não encontrado")
     
     try:
-        edf_info = chunk_manager.read_edf_info(edf_file.file_path)
+        edf_info = await eeg_executor.run("read", chunk_manager.read_edf_info, edf_file.file_path)
         chunks = chunk_manager.calculate_chunks(edf_info['duration'])
         
         if chunk_index >= len(chunks):
@@ -58,3 +68,123 @@ async def get_specific_chunk(
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao processar EDF: {str(e)}")
+
+def _resolve_chunk(edf_info: dict, chunk_index: Optional[int],
+                   start_time: Optional[float], end_time: Optional[float]) -> ChunkInfo:
+    try:
+        return chunk_manager.resolve_chunk(edf_info, chunk_index, start_time, end_time)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/edf/{edf_file_id}/envelope", response_model=EEGChunkEnvelopeResponse)
+async def get_chunk_envelope(
+    edf_file_id: uuid.UUID,
+    chunk_index: Optional[int] = Query(None, ge=0),
+    start_time: Optional[float] = Query(None, ge=0, description="Início em segundos (sem chunk_index)"),
+    end_time: Optional[float] = Query(None, gt=0, description="Fim em segundos (sem chunk_index)"),
+    width: int = Query(800, gt=0, le=10000, description="Largura de saída em pixels"),
+    channels: Optional[List[str]] = Query(None),
+    db: Session = Depends(get_db)
+):
+    edf_file = await _get_edf_file(db, edf_file_id)
+    if not edf_file:
+        raise HTTPException(status_code=404, detail="Arquivo EDF não encontrado")
+    
+    try:
+        edf_info = await eeg_executor.run("read", chunk_manager.read_edf_info, edf_file.file_path)
+        chunk = _resolve_chunk(edf_info, chunk_index, start_time, end_time)
+        envelope = await eeg_executor.run(
+            "read", chunk_manager.get_chunk_envelope, edf_file.file_path, chunk, width, channels
+        )
+        
+        return EEGChunkEnvelopeResponse(
+            chunk_info=EEGChunkInfo(**asdict(chunk)),
+            level=envelope['level'],
+            bucket_size=envelope['bucket_size'],
+            sample_frequency=envelope['sample_rate'],
+            times=envelope['times'].tolist(),
+            data_min={ch: envelope['data_min'][i].tolist() for i, ch in enumerate(envelope['channel_names'])},
+            data_max={ch: envelope['data_max'][i].tolist() for i, ch in enumerate(envelope['channel_names'])}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao processar EDF: {str(e)}")
+
+@router.get("/edf/{edf_file_id}/samples")
+async def stream_chunk_samples(
+    edf_file_id: uuid.UUID,
+    chunk_index: Optional[int] = Query(None, ge=0),
+    start_time: Optional[float] = Query(None, ge=0, description="Início em segundos (sem chunk_index)"),
+    end_time: Optional[float] = Query(None, gt=0, description="Fim em segundos (sem chunk_index)"),
+    channels: Optional[List[str]] = Query(None),
+    target_samples: Optional[int] = Query(None, gt=1, description="Reduz para no máximo N pontos (pares min/max do envelope)"),
+    format: str = Query("float32", enum=["float32", "int16"]),
+    db: Session = Depends(get_db)
+):
+    edf_file = await _get_edf_file(db, edf_file_id)
+    if not edf_file:
+        raise HTTPException(status_code=404, detail="Arquivo EDF não encontrado")
+    
+    try:
+        edf_info = await eeg_executor.run("read", chunk_manager.read_edf_info, edf_file.file_path)
+        chunk = _resolve_chunk(edf_info, chunk_index, start_time, end_time)
+        level = 0
+        minmax = False
+        
+        if target_samples:
+            envelope = await eeg_executor.run(
+                # Nível 2x mais fino que o necessário: agrupado depois, dá pelo
+                # menos 80% dos pontos pedidos com taxa uniforme
+                "read", chunk_manager.get_chunk_envelope, edf_file.file_path, chunk,
+                max(1, target_samples // 2) * 4, channels
+            )
+            level = envelope['level']
+            minmax = level > 0 or envelope['data_min'].shape[-1] > target_samples
+        
+        if minmax:
+            # Agrupa buckets vizinhos para no máximo target/2 pares (min, max)
+            n_pairs = max(1, target_samples // 2)
+            n_buckets = envelope['data_min'].shape[-1]
+            factor = -(-n_buckets // n_pairs)
+            data_min, data_max = group_envelope(envelope['data_min'], envelope['data_max'], factor)
+            times, data = interleave(data_min, data_max, envelope['times'][::factor])
+            channel_names = envelope['channel_names']
+            # Taxa dos pares: o par k (pontos 2k e 2k+1) começa em start + k / sample_rate
+            sample_rate = envelope['sample_rate'] / (envelope['bucket_size'] * factor)
+        elif target_samples:
+            # Nível 0 e já cabe no alvo: amostras originais
+            times, data = envelope['times'], envelope['data_min']
+            channel_names = envelope['channel_names']
+            sample_rate = envelope['sample_rate']
+        else:
+            chunk_data = await eeg_executor.run(
+                "read", chunk_manager.get_chunk_data, edf_file.file_path, chunk, channels
+            )
+            times, data = chunk_data['times'], chunk_data['data']
+            channel_names = chunk_data['channel_names']
+            sample_rate = chunk_data['sample_rate']
+        
+        encoder = SampleStreamEncoder(
+            data,
+            channel_names,
+            sample_rate,
+            float(times[0]) if len(times) else chunk.start_time,
+            format
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao processar EDF: {str(e)}")
+    
+    return StreamingResponse(
+        encoder.iter_bytes(),
+        media_type="application/octet-stream",
+        headers={
+            **encoder.headers(),
+            "X-EEG-Level": str(level),
+            "X-EEG-Layout": "minmax" if minmax else "samples",
+        }
+    )
@@ -1,14 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+from app.core.database import get_db, SessionLocal
 from app.core.models import EDFFile as EDFFileModel
 from app.core.schemas import EDFFileCreate, EDFFileUpdate, EDFFile as EDFFileSchema, EDFFileSimple
-from app.core.preprocessing import validate_and_preprocess, EDFValidationError
+from app.core.preprocessing import validate_header, validate_data, EDFValidationError
 from app.core.enums import ProcessingStatus
+from app.core.plots import plot_generator
+from app.core.sample_store import sample_store
 from pathlib import Path
+import logging
 import uuid
 import os
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 
@@ -41,6 +46,63 @@ def extract_metadata(raw, file_path: str):
     }
 
 
+def run_deep_validation(file_id: uuid.UUID, file_path: str):
+    """
+    Validação das amostras depois do cadastro (background task). O resultado
+    vai para processing_status (validated / invalid) e o relatório para
+    metadata_json["validation"]. Não sobrescreve o status se o arquivo foi
+    alterado ou removido enquanto era validado. Só arquivos válidos seguem
+    para a geração do sample store e dos overviews.
+    """
+    db = SessionLocal()
+    try:
+        db_file = db.query(EDFFileModel).filter(EDFFileModel.id == file_id).first()
+        if (
+            not db_file
+            or db_file.file_path != file_path
+            or db_file.processing_status != ProcessingStatus.HEADER_VALIDATED.value
+        ):
+            return
+        db_file.processing_status = ProcessingStatus.VALIDATING.value
+        db.commit()
+
+        try:
+            report = validate_data(file_path)
+            new_status = ProcessingStatus.VALIDATED.value
+            validation = {"issues": report["issues"]}
+        except EDFValidationError as e:
+            new_status = ProcessingStatus.INVALID.value
+            validation = {"error": str(e), "issues": e.issues}
+        except Exception as e:
+            # Falha inesperada (I/O etc.): volta ao estado anterior para nova tentativa
+            logger.warning(f"Validação profunda falhou para {file_path}: {e}")
+            new_status = ProcessingStatus.HEADER_VALIDATED.value
+            validation = None
+
+        db.refresh(db_file)
+        if (
+            db_file.file_path != file_path
+            or db_file.processing_status != ProcessingStatus.VALIDATING.value
+        ):
+            return
+        db_file.processing_status = new_status
+        if validation is not None:
+            # Novo dict: o JSONB só é marcado como alterado na atribuição
+            db_file.metadata_json = {**(db_file.metadata_json or {}), "validation": validation}
+        db.commit()
+    finally:
+        db.close()
+
+    if new_status == ProcessingStatus.VALIDATED.value:
+        # Sidecar memmap para leituras de chunks e, com ele pronto, os
+        # overviews de baixa resolução: só para arquivos válidos
+        if sample_store.ensure(file_path):
+            try:
+                plot_generator.schedule_file_overview(file_path)
+            except Exception as e:
+                logger.warning(f"Não foi possível agendar overview de {file_path}: {e}")
+
+
 # ---------- ROUTES ----------
 
 # GET ALL ACTIVE FILES
@@ -98,15 +160,20 @@ def get_edf_file(file_id: uuid.UUID, db: Session = Depends(get_db)):
 
 # CREATE FILE
 @router.post("/", response_model=EDFFileSchema, status_code=status.HTTP_201_CREATED)
-def create_edf_file(file_data: EDFFileCreate, db: Session = Depends(get_db)):
+def create_edf_file(
+    file_data: EDFFileCreate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+):
     existing_file = (
         db.query(EDFFileModel).filter(EDFFileModel.file_path == file_data.file_path).first()
     )
     if existing_file:
         raise HTTPException(status_code=400, detail="File with this path already exists")
 
+    # Só cabeçalho no cadastro; as amostras são validadas em background
     try:
-        raw = validate_and_preprocess(file_data.file_path)
+        raw = validate_header(file_data.file_path)
     except EDFValidationError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -118,32 +185,44 @@ def create_edf_file(file_data: EDFFileCreate, db: Session = Depends(get_db)):
         file_name=os.path.basename(file_data.file_path),
         session_name=file_data.session_name
         or os.path.basename(file_data.file_path),  # fallback automático
-        processing_status=ProcessingStatus.VALIDATED.value,
+        processing_status=ProcessingStatus.HEADER_VALIDATED.value,
         **meta,
     )
 
     db.add(db_file)
     db.commit()
     db.refresh(db_file)
+
+    # Valida as amostras e, se válidas, gera o sample store (fora da requisição)
+    background_tasks.add_task(run_deep_validation, db_file.id, db_file.file_path)
     return db_file
 
 
 # UPDATE FILE
 @router.put("/{file_id}", response_model=EDFFileSchema)
-def update_edf_file(file_id: uuid.UUID, file_data: EDFFileUpdate, db: Session = Depends(get_db)):
+def update_edf_file(
+    file_id: uuid.UUID,
+    file_data: EDFFileUpdate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+):
     db_file = db.query(EDFFileModel).filter(EDFFileModel.id == file_id).first()
     if not db_file or db_file.processing_status == ProcessingStatus.DELETED.value:
         raise HTTPException(status_code=404, detail="EDF file not found")
 
     if file_data.file_path:
         try:
-            raw = validate_and_preprocess(file_data.file_path)
+            raw = validate_header(file_data.file_path)
             meta = extract_metadata(raw, file_data.file_path)
             for k, v in meta.items():
                 setattr(db_file, k, v)
+            if db_file.file_path != file_data.file_path:
+                background_tasks.add_task(sample_store.remove, db_file.file_path)
+            db_file.file_path = file_data.file_path
             db_file.file_name = os.path.basename(file_data.file_path)
             db_file.session_name = file_data.session_name or db_file.file_name
-            db_file.processing_status = ProcessingStatus.VALIDATED.value
+            db_file.processing_status = ProcessingStatus.HEADER_VALIDATED.value
+            background_tasks.add_task(run_deep_validation, db_file.id, file_data.file_path)
         except EDFValidationError as e:
             raise HTTPException(status_code=400, detail=str(e))
 
@@ -157,12 +236,14 @@ def update_edf_file(file_id: uuid.UUID, file_data: EDFFileUpdate, db: Session =
 
 # SOFT DELETE FILE
 @router.delete("/{file_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_edf_file(file_id: uuid.UUID, db: Session = Depends(get_db)):
+def delete_edf_file(file_id: uuid.UUID, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     db_file = db.query(EDFFileModel).filter(EDFFileModel.id == file_id).first()
     if not db_file or db_file.processing_status == ProcessingStatus.DELETED.value:
         raise HTTPException(status_code=404, detail="EDF file not found")
 
     db_file.processing_status = ProcessingStatus.DELETED.value
     db.commit()
+    # Sample store (~6x o EDF) sai junto; é gerado de novo se o arquivo for restaurado
+    background_tasks.add_task(sample_store.remove, db_file.file_path)
     return
 
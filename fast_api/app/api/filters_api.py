@@ -5,6 +5,7 @@ from sqlalchemy.orm import Session
 from app.core.filters import filter_data
 from app.core.preprocessing import validate_and_preprocess, EDFValidationError
 from app.core.database import get_db
+from app.core.discovery import discovery_index
 from app.core.models import EDFFile, PatientMetadata, Trial
 
 router = APIRouter()
@@ -12,24 +13,21 @@ DATA_CONTAINER_PATH = Path(os.getenv("EDF_CONTAINER_PATH", "/data"))
 OUTPUT_CONTAINER_PATH = Path(os.getenv("OUTPUT_CONTAINER_PATH", "/tmp/output"))
 
 # ---------- HELPERS ----------
-def discover_files(data_dir: str = DATA_CONTAINER_PATH):
-    edf_files = []
+def discover_files(
+    db: Session,
+    data_dir: str = DATA_CONTAINER_PATH,
+    refresh: bool = False,
+    skip: int = 0,
+    limit: int | None = None,
+):
     data_path = Path(data_dir)
     
-    if not data_path.exists():
-        return []
-    
-    for file_path in data_path.rglob("*.edf"):
-        edf_files.append({
-            "path": str(file_path),
-            "name": file_path.name,
-            "size": file_path.stat().st_size
-        })
-    
-    return edf_files
+    # Índice incremental: só arquivos novos/alterados têm o cabeçalho lido
+    discovery_index.refresh(db, data_path, force=refresh)
+    return discovery_index.list_files(db, data_path, skip=skip, limit=limit)
 
 
-def load_and_validate_file(file_name: str):
+def load_and_validate_file(file_name: str, channels: list[str] | None = None):
     data_dir = DATA_CONTAINER_PATH
     file_path = data_dir / file_name
     
@@ -37,7 +35,7 @@ def load_and_validate_file(file_name: str):
         raise HTTPException(status_code=404, detail=f"File not found: {file_name}")
     
     try:
-        raw = validate_and_preprocess(str(file_path))
+        raw = validate_and_preprocess(str(file_path), channels=channels)
         return raw, str(file_path)
     except EDFValidationError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -79,8 +77,13 @@ def process_and_save(
 
 # ---------- ROUTES ----------
 @router.get("/discover")
-def discover():
-    return discover_files()
+def discover(
+    refresh: bool = Query(False, description="Força a atualização do índice"),
+    skip: int = 0,
+    limit: int | None = None,
+    db: Session = Depends(get_db),
+):
+    return discover_files(db, refresh=refresh, skip=skip, limit=limit)
 
 
 @router.post("/{file_name}/apply")
@@ -93,10 +96,11 @@ def apply_filters(
     notch: float | None = Query(None, description="Notch (custom)"),
     patient_id: str | None = Query(None, description="patient_iid (auto)"),
     trial_id: str | None = Query(None, description="ID do trial (auto)"),
+    channels: list[str] | None = Query(None, description="Canais a processar (padrão: todos)"),
     db: Session = Depends(get_db),
 ):
-    # Carrega e valida EDF
-    raw, file_path = load_and_validate_file(file_name)
+    # Carrega e valida EDF (apenas os canais pedidos são decodificados)
+    raw, file_path = load_and_validate_file(file_name, channels)
 
     patient_metadata = None
     trial_metadata = None
@@ -1,73 +1,167 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+import asyncio
+import json
 import uuid
+from dataclasses import asdict
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 import os
 from app.core.database import get_db
-from app.core.models import EDFFile
+from app.core.models import EDFFile, Trial
 from app.core.chunks import chunk_manager
-from app.core.plots import plot_generator
-from app.core.schemas import EEGChunkRequest, EEGPlotResponse, EEGChunkInfo
+from app.core.executor import eeg_executor
+from app.core.plots import (
+    plot_generator, render_chunk_plot, DECIMATORS, EEG_PLOT_RENDERER, IMAGE_MEDIA_TYPES, PLOT_OVERVIEW_VIEW
+)
+from app.core.renderers import renderers
+from app.core.enums import ProcessingStatus
+from app.core.sample_store import sample_store, SampleStoreNotReady, SAMPLE_STORE_RETRY_AFTER
+from app.core.sample_stream import PolylineEncoder
+from app.core.tiles import tile_service
+from app.core.spectral import spectral_analyzer
+from app.core.schemas import EEGChunkRequest, EEGPlotBatchRequest, EEGPlotResponse, EEGChunkInfo
 
 router = APIRouter(prefix="/plots", tags=["plots"])
 
+# Cache HTTP (navegador/nginx); depois disso revalida com If-None-Match
+PLOT_HTTP_MAX_AGE = int(os.getenv("PLOT_HTTP_MAX_AGE", "60"))
+
+async def _get_edf_file(db: Session, edf_file_id: uuid.UUID):
+    # Sessão síncrona do SQLAlchemy: consulta fora do event loop
+    return await run_in_threadpool(lambda: db.query(EDFFile).filter(EDFFile.id == edf_file_id).first())
+
+def _validate_view(renderer: Optional[str], decimation: Optional[str]):
+    if renderer and renderer not in renderers:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Renderer inválido: {renderer}. Opções: {list(renderers)}"
+        )
+    if decimation and decimation not in DECIMATORS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Decimação inválida: {decimation}. Opções: {list(DECIMATORS)}"
+        )
+
+async def _require_sample_store(edf_file: EDFFile, pending_status: int = 503):
+    """
+    Tiles e miniatura leem só do sample store, que nunca é gerado dentro da
+    requisição: enquanto a geração em background (ingestão) não termina,
+    responde `pending_status` com Retry-After.
+    """
+    status = edf_file.processing_status
+    # Antes do atalho is_current: um store antigo não torna o arquivo válido
+    if status == ProcessingStatus.INVALID.value:
+        raise HTTPException(status_code=409, detail="Arquivo EDF inválido: amostras indisponíveis para plot")
+    if await eeg_executor.run("read", sample_store.is_current, edf_file.file_path):
+        return
+    if status not in (ProcessingStatus.HEADER_VALIDATED.value, ProcessingStatus.VALIDATING.value):
+        # Validação concluída (ou cadastro anterior à geração na ingestão)
+        sample_store.schedule(edf_file.file_path)
+    raise _not_ready(pending_status)
+
+def _not_ready(status_code: int = 503) -> HTTPException:
+    return HTTPException(
+        status_code=status_code,
+        detail="Amostras do arquivo em preparação, tente novamente em instantes",
+        headers={"Retry-After": str(SAMPLE_STORE_RETRY_AFTER)}
+    )
+
+def _render_operation(renderer: Optional[str]) -> str:
+    # Só o matplotlib (estado global do pyplot) precisa do semáforo de 1 slot
+    return "render_matplotlib" if (renderer or EEG_PLOT_RENDERER) == "matplotlib" else "render"
+
+def _validate_channels(available_channels: List[str], channels: Optional[List[str]]):
+    if channels:
+        invalid_channels = [ch for ch in channels if ch not in available_channels]
+        
+        if invalid_channels and len(invalid_channels) == len(channels):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Nenhum canal válido especificado. Canais disponíveis: {available_channels}"
+            )
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match usa comparação fraca: ignora o prefixo W/
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+async def _resolve_plot_chunk(
+    file_path: str,
+    chunk_index: Optional[int],
+    start_time: Optional[float],
+    end_time: Optional[float],
+    channels: Optional[List[str]]
+):
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail=f"Arquivo físico não encontrado: {file_path}")
+    
+    edf_info = await eeg_executor.run("read", chunk_manager.read_edf_info, file_path)
+    try:
+        chunk_info = chunk_manager.resolve_chunk(
+            edf_info, chunk_index=chunk_index, start_time=start_time, end_time=end_time
+        )
+    except (LookupError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    _validate_channels(edf_info['channel_names'], channels)
+    return edf_info, chunk_info
+
 @router.post("/eeg", response_model=EEGPlotResponse)
 async def generate_eeg_plot(
     request: EEGChunkRequest,
     db: Session = Depends(get_db)
 ):
-    edf_file = db.query(EDFFile).filter(EDFFile.id == request.edf_file_id).first()
+    edf_file = await _get_edf_file(db, request.edf_file_id)
     
     if not edf_file:
         raise HTTPException(status_code=404, detail="Arquivo EDF não encontrado no banco de dados")
     
+    _validate_view(request.renderer, request.decimation)
+    
     try:
-        if not os.path.exists(edf_file.file_path):
-            raise HTTPException(
-                status_code=404, 
-                detail=f"Arquivo físico não encontrado: {edf_file.file_path}"
-            )
-        
-        edf_info = chunk_manager.read_edf_info(edf_file.file_path)
-        
-        chunks = chunk_manager.calculate_chunks(edf_info['duration'])
-        
-        if request.chunk_index >= len(chunks):
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Chunk {request.chunk_index} não existe. Arquivo tem {len(chunks)} chunks"
-            )
-        
-        chunk_info = chunks[request.chunk_index]
-        
-        available_channels = edf_info['channel_names']
-        
-        if request.channels:
-            invalid_channels = [ch for ch in request.channels if ch not in available_channels]
-            
-            if invalid_channels and len(invalid_channels) == len(request.channels):
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Nenhum canal válido especificado. Canais disponíveis: {available_channels}"
-                )
+        edf_info, chunk_info = await _resolve_plot_chunk(
+            edf_file.file_path, request.chunk_index, request.start_time, request.end_time, request.channels
+        )
         
-        plot_result = plot_generator.generate_chunk_plot(
+        plot_result = await eeg_executor.run(
+            _render_operation(request.renderer),
+            plot_generator.generate_chunk_plot,
             edf_file.file_path,
             chunk_info,
             request.width,
             request.height,
-            request.channels
+            request.channels,
+            request.target_samples,
+            request.renderer,
+            request.decimation
         )
         
-        chunk_info_schema = EEGChunkInfo(
-            chunk_index=chunk_info.chunk_index,
-            start_time=chunk_info.start_time,
-            end_time=chunk_info.end_time,
-            duration=chunk_info.duration,
-            is_full_chunk=chunk_info.is_full_chunk
+        # Navegação sequencial: próximo chunk já renderizado em background
+        # (o agendamento calcula chaves com stat() do arquivo: fora do event loop)
+        await eeg_executor.run(
+            "read",
+            plot_generator.prefetch_neighbors,
+            edf_file.file_path,
+            chunk_info,
+            chunk_manager.calculate_chunks(edf_info['duration']),
+            request.width,
+            request.height,
+            request.channels,
+            request.target_samples,
+            request.renderer,
+            request.decimation
         )
         
+        chunk_info_schema = EEGChunkInfo(**asdict(chunk_info))
+        
         return EEGPlotResponse(
             png_data=plot_result['png_data'],
             chunk_info=chunk_info_schema,
@@ -80,12 +174,493 @@ async def generate_eeg_plot(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao gerar plot: {str(e)}")
 
+@router.post("/eeg/batch")
+async def generate_eeg_plot_batch(
+    batch: EEGPlotBatchRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Renderiza vários chunks em paralelo no pool de processos e devolve NDJSON,
+    uma linha por plot na ordem em que terminam. Cada linha traz `index` (a
+    posição no pedido) e `status`; falhas individuais não derrubam o lote.
+    """
+    edf_ids = {request.edf_file_id for request in batch.requests}
+    edf_files = await run_in_threadpool(
+        lambda: {f.id: f.file_path for f in db.query(EDFFile).filter(EDFFile.id.in_(edf_ids))}
+    )
+    
+    async def render(index: int, request: EEGChunkRequest) -> dict:
+        try:
+            file_path = edf_files.get(request.edf_file_id)
+            if file_path is None:
+                raise HTTPException(status_code=404, detail="Arquivo EDF não encontrado no banco de dados")
+            _validate_view(request.renderer, request.decimation)
+            _, chunk_info = await _resolve_plot_chunk(
+                file_path, request.chunk_index, request.start_time, request.end_time, request.channels
+            )
+            
+            plot_result = await eeg_executor.run_in_process(
+                render_chunk_plot,
+                file_path,
+                chunk_info,
+                request.width,
+                request.height,
+                request.channels,
+                request.target_samples,
+                request.renderer,
+                request.decimation
+            )
+            
+            response = EEGPlotResponse(
+                png_data=plot_result['png_data'],
+                chunk_info=EEGChunkInfo(**asdict(chunk_info)),
+                generated_at=datetime.now()
+            )
+            return {
+                "index": index,
+                "status": 200,
+                **jsonable_encoder(response),
+                "channels_plotted": plot_result['channels_plotted']
+            }
+        except HTTPException as e:
+            return {"index": index, "status": e.status_code, "detail": e.detail}
+        except Exception as e:
+            return {"index": index, "status": 500, "detail": f"Erro ao gerar plot: {str(e)}"}
+    
+    async def stream():
+        tasks = [asyncio.create_task(render(i, request)) for i, request in enumerate(batch.requests)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+        finally:
+            # Cliente desconectou: não espera o resto do lote
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+async def _spectral_response(
+    kind: str,
+    edf_file_id: uuid.UUID,
+    chunk_index: Optional[int],
+    start_time: Optional[float],
+    end_time: Optional[float],
+    trial_id: Optional[uuid.UUID],
+    channels: Optional[List[str]],
+    nperseg: Optional[int],
+    noverlap: Optional[int],
+    fmin: Optional[float],
+    fmax: Optional[float],
+    format: str,
+    width: int,
+    height: int,
+    colormap: str,
+    db: Session
+):
+    edf_file = await _get_edf_file(db, edf_file_id)
+    if not edf_file:
+        raise HTTPException(status_code=404, detail="Arquivo EDF não encontrado no banco de dados")
+    
+    if trial_id:
+        trial = await run_in_threadpool(lambda: db.query(Trial).filter(Trial.id == trial_id).first())
+        if not trial or trial.edf_file_id != edf_file.id:
+            raise HTTPException(status_code=404, detail="Trial não encontrado para este EDF")
+        chunk_index, start_time, end_time = None, trial.start_time, trial.start_time + trial.duration
+    
+    try:
+        _, chunk_info = await _resolve_plot_chunk(
+            edf_file.file_path, chunk_index, start_time, end_time, channels
+        )
+        try:
+            result = await eeg_executor.run(
+                "read", spectral_analyzer.compute, kind, edf_file.file_path, chunk_info, channels, nperseg, noverlap
+            )
+            result = spectral_analyzer.crop(result, fmin, fmax)
+            if format == "png":
+                png = await eeg_executor.run("render", spectral_analyzer.render, result, width, height, colormap)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao calcular espectro: {str(e)}")
+    
+    if format == "png":
+        return Response(
+            content=png,
+            media_type="image/png",
+            headers={"X-EEG-Channels": ",".join(result['channel_names'])}
+        )
+    return {"edf_file_id": edf_file_id, **spectral_analyzer.to_dict(result)}
+
+@router.get("/eeg/{edf_file_id}/psd")
+async def get_eeg_psd(
+    edf_file_id: uuid.UUID,
+    chunk_index: Optional[int] = Query(None, ge=0),
+    start_time: Optional[float] = Query(None, ge=0),
+    end_time: Optional[float] = Query(None, gt=0),
+    trial_id: Optional[uuid.UUID] = Query(None, description="Usa o intervalo do trial"),
+    channels: Optional[List[str]] = Query(None),
+    nperseg: Optional[int] = Query(None, gt=1, description="Amostras por janela (padrão: 2 s)"),
+    noverlap: Optional[int] = Query(None, ge=0, description="Padrão: nperseg / 2"),
+    fmin: Optional[float] = Query(None, ge=0),
+    fmax: Optional[float] = Query(None, gt=0),
+    format: str = Query("json", enum=["json", "png"]),
+    width: int = Query(800, gt=0),
+    height: int = Query(400, gt=0),
+    colormap: str = Query("viridis"),
+    db: Session = Depends(get_db)
+):
+    """PSD (Welch) por canal: arrays crus (json) ou heatmap canal x frequência (png)."""
+    return await _spectral_response(
+        "psd", edf_file_id, chunk_index, start_time, end_time, trial_id, channels,
+        nperseg, noverlap, fmin, fmax, format, width, height, colormap, db
+    )
+
+@router.get("/eeg/{edf_file_id}/spectrogram")
+async def get_eeg_spectrogram(
+    edf_file_id: uuid.UUID,
+    chunk_index: Optional[int] = Query(None, ge=0),
+    start_time: Optional[float] = Query(None, ge=0),
+    end_time: Optional[float] = Query(None, gt=0),
+    trial_id: Optional[uuid.UUID] = Query(None, description="Usa o intervalo do trial"),
+    channels: Optional[List[str]] = Query(None),
+    nperseg: Optional[int] = Query(None, gt=1, description="Amostras por janela (padrão: 1 s)"),
+    noverlap: Optional[int] = Query(None, ge=0, description="Padrão: nperseg / 2"),
+    fmin: Optional[float] = Query(None, ge=0),
+    fmax: Optional[float] = Query(None, gt=0),
+    format: str = Query("png", enum=["json", "png"]),
+    width: int = Query(800, gt=0),
+    height: int = Query(400, gt=0),
+    colormap: str = Query("viridis"),
+    db: Session = Depends(get_db)
+):
+    """Espectrograma (STFT) por canal: arrays crus (json) ou um painel por canal (png)."""
+    return await _spectral_response(
+        "spectrogram", edf_file_id, chunk_index, start_time, end_time, trial_id, channels,
+        nperseg, noverlap, fmin, fmax, format, width, height, colormap, db
+    )
+
+@router.get("/tiles/{edf_file_id}")
+async def describe_eeg_tiles(
+    edf_file_id: uuid.UUID,
+    db: Session = Depends(get_db)
+):
+    """Grade de tiles do EDF: zooms, tiles por zoom, blocos de canais e escalas globais."""
+    edf_file = await _get_edf_file(db, edf_file_id)
+    if not edf_file:
+        raise HTTPException(status_code=404, detail="Arquivo EDF não encontrado no banco de dados")
+    if not os.path.exists(edf_file.file_path):
+        raise HTTPException(status_code=404, detail=f"Arquivo físico não encontrado: {edf_file.file_path}")
+    
+    try:
+        await _require_sample_store(edf_file)
+        grid = await eeg_executor.run("read", tile_service.describe, edf_file.file_path)
+    except HTTPException:
+        raise
+    except SampleStoreNotReady:
+        raise _not_ready()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao preparar tiles: {str(e)}")
+    
+    return {"edf_file_id": edf_file_id, **grid}
+
+@router.get("/tiles/{edf_file_id}/{zoom}/{time_tile}/{channel_block}")
+async def get_eeg_tile(
+    edf_file_id: uuid.UUID,
+    zoom: int,
+    time_tile: int,
+    channel_block: int,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Tile PNG de tamanho fixo: 2**zoom amostras por coluna, tiles de tempo
+    contíguos e blocos fixos de canais. O frontend monta a visualização com
+    os tiles, como em um mapa.
+    """
+    edf_file = await _get_edf_file(db, edf_file_id)
+    if not edf_file:
+        raise HTTPException(status_code=404, detail="Arquivo EDF não encontrado no banco de dados")
+    if not os.path.exists(edf_file.file_path):
+        raise HTTPException(status_code=404, detail=f"Arquivo físico não encontrado: {edf_file.file_path}")
+    
+    try:
+        await _require_sample_store(edf_file)
+        try:
+            await eeg_executor.run(
+                "read", tile_service.validate, edf_file.file_path, zoom, time_tile, channel_block
+            )
+        except LookupError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        
+        cache_headers = {"Cache-Control": f"public, max-age={PLOT_HTTP_MAX_AGE}"}
+        tile_key = await eeg_executor.run(
+            "read", tile_service.tile_key, edf_file.file_path, zoom, time_tile, channel_block
+        )
+        etag = f'"{tile_key}"'
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag, **cache_headers})
+        
+        tile = await eeg_executor.run(
+            "render", tile_service.get_tile, edf_file.file_path, zoom, time_tile, channel_block
+        )
+    except HTTPException:
+        raise
+    except SampleStoreNotReady:
+        raise _not_ready()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar tile: {str(e)}")
+    
+    return Response(
+        content=tile['png'],
+        media_type="image/png",
+        headers={"ETag": etag, **cache_headers, "X-EEG-Channels": ",".join(tile['channels'])}
+    )
+
+@router.get("/cache/stats")
+async def get_plot_cache_stats():
+    return plot_generator.cache_stats()
+
 @router.delete("/cache")
 async def clear_plot_cache(
-    edf_file_id: Optional[uuid.UUID] = Query(None, description="ID do EDF para limpar cache")
+    edf_file_id: Optional[uuid.UUID] = Query(None, description="ID do EDF para limpar cache"),
+    db: Session = Depends(get_db)
+):
+    file_path = None
+    if edf_file_id:
+        edf_file = await _get_edf_file(db, edf_file_id)
+        if not edf_file:
+            raise HTTPException(status_code=404, detail="Arquivo EDF não encontrado no banco de dados")
+        file_path = edf_file.file_path
+    
+    removed = await run_in_threadpool(plot_generator.clear_cache, file_path)
+    
+    return {
+        "message": f"Cache de plots {'completo' if not edf_file_id else 'do EDF ' + str(edf_file_id) + ' limpo'}",
+        "removed": removed
+    }
+
+async def _image_response(
+    file_path: str,
+    chunk_info,
+    view: dict,
+    image_format: str,
+    if_none_match: Optional[str]
+) -> Response:
+    cache_headers = {"Cache-Control": f"public, max-age={PLOT_HTTP_MAX_AGE}"}
+    
+    # A chave depende só dos parâmetros e do fingerprint do EDF: 304 sem renderizar
+    etag = await eeg_executor.run(
+        "read", plot_generator.chunk_etag, file_path, chunk_info, **view, image_format=image_format
+    )
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, **cache_headers})
+    
+    image = await eeg_executor.run(
+        _render_operation(view['renderer']),
+        plot_generator.generate_chunk_image, file_path, chunk_info, **view, image_format=image_format
+    )
+    return Response(
+        content=image['content'],
+        media_type=image['media_type'],
+        headers={
+            "ETag": image['etag'],
+            **cache_headers,
+            "X-EEG-Start-Time": repr(chunk_info.start_time),
+            "X-EEG-End-Time": repr(chunk_info.end_time),
+            "X-EEG-Channels": ",".join(image['channels_plotted']),
+        }
+    )
+
+def _validate_format(image_format: str):
+    if image_format not in IMAGE_MEDIA_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Formato inválido: {image_format}. Opções: {list(IMAGE_MEDIA_TYPES)}"
+        )
+
+@router.get("/eeg/{edf_file_id}")
+async def get_eeg_plot_image(
+    edf_file_id: uuid.UUID,
+    chunk_index: Optional[int] = Query(None, ge=0),
+    start_time: Optional[float] = Query(None, ge=0, description="Início em segundos (sem chunk_index)"),
+    end_time: Optional[float] = Query(None, gt=0, description="Fim em segundos (sem chunk_index)"),
+    width: int = Query(800, gt=0),
+    height: int = Query(400, gt=0),
+    channels: Optional[List[str]] = Query(None),
+    target_samples: Optional[int] = Query(None, gt=0),
+    renderer: Optional[str] = Query(None),
+    decimation: Optional[str] = Query(None),
+    preview: bool = Query(False, description="Overview de baixa resolução gerado na ingestão"),
+    format: str = Query("png", enum=list(IMAGE_MEDIA_TYPES)),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Mesmo plot do POST /eeg, mas como imagem binária (sem base64/JSON), com
+    ETag forte derivado da chave de cache e 304 para If-None-Match. Com
+    preview=true ignora os parâmetros de visualização e usa o overview.
+    """
+    _validate_view(renderer, decimation)
+    _validate_format(format)
+    edf_file = await _get_edf_file(db, edf_file_id)
+    if not edf_file:
+        raise HTTPException(status_code=404, detail="Arquivo EDF não encontrado no banco de dados")
+    
+    try:
+        if preview:
+            channels = None
+        edf_info, chunk_info = await _resolve_plot_chunk(
+            edf_file.file_path, chunk_index, start_time, end_time, channels
+        )
+        
+        if preview:
+            return await _image_response(
+                edf_file.file_path, chunk_info, PLOT_OVERVIEW_VIEW, format, if_none_match
+            )
+        
+        view = {
+            "width": width,
+            "height": height,
+            "channels": channels,
+            "target_samples": target_samples,
+            "renderer": renderer,
+            "decimation": decimation,
+        }
+        response = await _image_response(edf_file.file_path, chunk_info, view, format, if_none_match)
+        await eeg_executor.run(
+            "read",
+            plot_generator.prefetch_neighbors,
+            edf_file.file_path,
+            chunk_info,
+            chunk_manager.calculate_chunks(edf_info['duration']),
+            **view
+        )
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar plot: {str(e)}")
+
+@router.get("/eeg/{edf_file_id}/polyline")
+async def get_eeg_polyline(
+    edf_file_id: uuid.UUID,
+    chunk_index: Optional[int] = Query(None, ge=0),
+    start_time: Optional[float] = Query(None, ge=0, description="Início em segundos (sem chunk_index)"),
+    end_time: Optional[float] = Query(None, gt=0, description="Fim em segundos (sem chunk_index)"),
+    width: int = Query(800, gt=0, description="Largura em pixels; ~2 pontos por pixel"),
+    channels: Optional[List[str]] = Query(None),
+    target_samples: Optional[int] = Query(None, gt=0),
+    decimation: Optional[str] = Query(None),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
 ):
-    plot_generator.clear_cache(str(edf_file_id) if edf_file_id else None)
+    """
+    Polilinhas decimadas por canal em float32 (formato em
+    app.core.sample_stream.PolylineEncoder) para renderização WebGL no
+    cliente: mesma leitura e decimação dos plots, sem render no servidor.
+    """
+    _validate_view(None, decimation)
+    edf_file = await _get_edf_file(db, edf_file_id)
+    if not edf_file:
+        raise HTTPException(status_code=404, detail="Arquivo EDF não encontrado no banco de dados")
+    
+    try:
+        _, chunk_info = await _resolve_plot_chunk(
+            edf_file.file_path, chunk_index, start_time, end_time, channels
+        )
+        
+        cache_headers = {"Cache-Control": f"public, max-age={PLOT_HTTP_MAX_AGE}"}
+        etag = await eeg_executor.run(
+            "read", plot_generator.polyline_etag,
+            edf_file.file_path, chunk_info, width, channels, target_samples, decimation
+        )
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag, **cache_headers})
+        
+        times, traces, chunk_data = await eeg_executor.run(
+            "read",
+            plot_generator.decimated_traces,
+            edf_file.file_path,
+            chunk_info,
+            width,
+            channels,
+            target_samples,
+            decimation
+        )
+        encoder = PolylineEncoder(
+            times, traces, chunk_data['channel_names'], chunk_info.start_time, chunk_info.end_time
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar polilinhas: {str(e)}")
+    
+    return Response(
+        content=encoder.to_bytes(),
+        media_type="application/octet-stream",
+        headers={"ETag": etag, **cache_headers, **encoder.headers()}
+    )
+
+@router.get("/eeg/{edf_file_id}/thumbnail")
+async def get_eeg_thumbnail(
+    edf_file_id: uuid.UUID,
+    format: str = Query("png", enum=list(IMAGE_MEDIA_TYPES)),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Miniatura da gravação inteira (gerada na ingestão; renderiza se faltar).
+    202 com Retry-After enquanto o sample store não estiver pronto.
+    """
+    _validate_format(format)
+    edf_file = await _get_edf_file(db, edf_file_id)
+    if not edf_file:
+        raise HTTPException(status_code=404, detail="Arquivo EDF não encontrado no banco de dados")
+    
+    try:
+        edf_info, _ = await _resolve_plot_chunk(edf_file.file_path, 0, None, None, None)
+        thumbnail = chunk_manager.full_range(edf_info)
+        # A gravação inteira só é barata com a pirâmide em disco
+        await _require_sample_store(edf_file, pending_status=202)
+        return await _image_response(edf_file.file_path, thumbnail, PLOT_OVERVIEW_VIEW, format, if_none_match)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar miniatura: {str(e)}")
+
+@router.post("/eeg/{edf_file_id}/overview", status_code=202)
+async def schedule_eeg_overview(
+    edf_file_id: uuid.UUID,
+    db: Session = Depends(get_db)
+):
+    """
+    Enfileira em baixa prioridade os overviews de todos os chunks e a
+    miniatura da gravação. A validação profunda já agenda isso sozinha quando
+    o arquivo fica válido; antes disso nada é agendado (scheduled=False) e
+    arquivos inválidos recebem 409.
+    """
+    edf_file = await _get_edf_file(db, edf_file_id)
+    if not edf_file:
+        raise HTTPException(status_code=404, detail="Arquivo EDF não encontrado no banco de dados")
+    if edf_file.processing_status == ProcessingStatus.INVALID.value:
+        raise HTTPException(status_code=409, detail="Arquivo EDF inválido: overview não agendado")
+    if edf_file.processing_status in (ProcessingStatus.HEADER_VALIDATED.value, ProcessingStatus.VALIDATING.value):
+        return {"edf_file_id": edf_file_id, "scheduled": False, "plots": 0}
+    
+    try:
+        edf_info, _ = await _resolve_plot_chunk(edf_file.file_path, 0, None, None, None)
+        chunks = chunk_manager.calculate_chunks(edf_info['duration'])
+        thumbnail = chunk_manager.full_range(edf_info)
+        scheduled = plot_generator.schedule_overview(edf_file.file_path, chunks, thumbnail)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao agendar overview: {str(e)}")
     
     return {
-        "message": f"Cache de plots {'completo' if not edf_file_id else 'do EDF ' + str(edf_file_id) + ' limpo'}"
+        "edf_file_id": edf_file_id,
+        "scheduled": scheduled,
+        "plots": len(chunks) + 1
     }
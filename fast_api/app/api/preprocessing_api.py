@@ -1,17 +1,26 @@
 import os
 from pathlib import Path
 from fastapi import APIRouter, HTTPException, Query
-from app.core.preprocessing import validate_and_preprocess, EDFValidationError
+from app.core.preprocessing import validate_and_preprocess, EDFValidationError, NORMALIZATION_METHODS
 
 router = APIRouter()
 
 EDF_CONTAINER_PATH = Path(os.getenv("EDF_CONTAINER_PATH", "/data_mango"))
 
 @router.get("/validate")
-def validate_edf(file_name: str = Query(..., description="Nome do arquivo EDF")):
+def validate_edf(
+    file_name: str = Query(..., description="Nome do arquivo EDF"),
+    channels: list[str] | None = Query(None, description="Canais a validar (padrão: todos)"),
+    normalization: str = Query("zscore", enum=list(NORMALIZATION_METHODS)),
+):
+    if normalization not in NORMALIZATION_METHODS:
+        raise HTTPException(status_code=400, detail=f"Normalização inválida: {normalization}")
+
     file_path = EDF_CONTAINER_PATH / file_name
     try:
-        raw = validate_and_preprocess(file_path)
+        raw, stats = validate_and_preprocess(
+            file_path, channels=channels, normalization=normalization, return_stats=True
+        )
     except EDFValidationError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -24,4 +33,10 @@ def validate_edf(file_name: str = Query(..., description="Nome do arquivo EDF"))
         "sfreq": raw.info["sfreq"],
         "duration_sec": raw.times[-1],
         "ch_names": raw.info["ch_names"],
+        "normalization": {
+            "method": stats["method"],
+            "center": dict(zip(stats["channel_names"], stats["center"].tolist())),
+            "scale": dict(zip(stats["channel_names"], stats["scale"].tolist())),
+        },
+        "quality_issues": stats["quality"]["issues"],
     }
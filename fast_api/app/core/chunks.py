@@ -1,8 +1,13 @@
 from dataclasses import dataclass
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import mne
 import numpy as np
 
+from .edf_cache import edf_info_cache
+from .precision import resolve_dtype
+from .pyramid import envelope, select_level
+from .sample_store import sample_store
+
 @dataclass
 class ChunkInfo:
     chunk_index: int
@@ -10,6 +15,9 @@ class ChunkInfo:
     end_time: float
     duration: float
     is_full_chunk: bool
+    # Intervalo exato [start_sample, stop_sample) quando vem de um time range
+    start_sample: Optional[int] = None
+    stop_sample: Optional[int] = None
 
 class ChunkManager:
     
@@ -47,47 +55,125 @@ class ChunkManager:
         
         return chunks
     
+    @classmethod
+    def full_range(cls, edf_info: Dict) -> ChunkInfo:
+        """A gravação inteira, até n_times (exclusivo): 'duration' é o instante da última amostra."""
+        return cls.time_range(edf_info, 0, edf_info['n_times'] / edf_info['sample_rate'])
+    
+    @staticmethod
+    def time_range(edf_info: Dict, start_time: float, end_time: float) -> ChunkInfo:
+        """
+        Resolve [start_time, end_time) em índices exatos de amostra, sem passar
+        pelos chunks fixos de 600 s. Levanta ValueError para intervalos vazios.
+        """
+        sfreq = edf_info['sample_rate']
+        n_times = edf_info['n_times']
+        if start_time < 0 or end_time <= start_time:
+            raise ValueError("Intervalo inválido: end_time deve ser maior que start_time")
+        
+        start_sample = min(int(np.floor(start_time * sfreq)), n_times)
+        stop_sample = min(int(np.ceil(end_time * sfreq)), n_times)
+        if stop_sample <= start_sample:
+            raise ValueError(f"Intervalo fora da gravação (duração {edf_info['duration']:.1f}s)")
+        
+        return ChunkInfo(
+            chunk_index=-1,
+            start_time=start_sample / sfreq,
+            end_time=(stop_sample - 1) / sfreq,
+            duration=(stop_sample - start_sample) / sfreq,
+            is_full_chunk=False,
+            start_sample=start_sample,
+            stop_sample=stop_sample
+        )
+    
+    @staticmethod
+    def resolve_chunk(edf_info: Dict, chunk_index: Optional[int] = None,
+                      start_time: Optional[float] = None, end_time: Optional[float] = None) -> ChunkInfo:
+        """
+        Aceita chunk_index (chunks fixos) ou start_time/end_time (time range).
+        Levanta LookupError para chunk inexistente e ValueError para parâmetros inválidos.
+        """
+        if start_time is not None or end_time is not None:
+            if start_time is None or end_time is None:
+                raise ValueError("Informe start_time e end_time juntos")
+            return ChunkManager.time_range(edf_info, start_time, end_time)
+        
+        if chunk_index is None:
+            raise ValueError("Informe chunk_index ou start_time e end_time")
+        
+        chunks = ChunkManager.calculate_chunks(edf_info['duration'])
+        if chunk_index < 0 or chunk_index >= len(chunks):
+            raise LookupError(f"Chunk {chunk_index} não existe. Arquivo tem {len(chunks)} chunks")
+        return chunks[chunk_index]
+    
     @staticmethod
     def read_edf_info(file_path: str) -> Dict:
         try:
-            raw = mne.io.read_raw_edf(file_path, preload=False, verbose=False)
-            info = {
-                'n_channels': len(raw.ch_names),
-                'duration': raw.times[-1] if len(raw.times) > 0 else 0,
-                'sample_rate': raw.info['sfreq'],
-                'channel_names': raw.ch_names,
-                'n_times': raw.n_times
-            }
-            raw.close()
-            return info
+            return edf_info_cache.get_or_load(file_path, ChunkManager._load_edf_info)
         except Exception as e:
             raise RuntimeError(f"Erro ao ler arquivo EDF: {str(e)}")
     
     @staticmethod
-    def get_chunk_data(file_path: str, chunk_info: ChunkInfo, channels: Optional[List[str]] = None) -> Dict:
+    def _load_edf_info(file_path: str) -> Dict:
+        raw = mne.io.read_raw_edf(file_path, preload=False, verbose=False)
+        info = {
+            'n_channels': len(raw.ch_names),
+            'duration': float(raw.times[-1]) if len(raw.times) > 0 else 0,
+            'sample_rate': raw.info['sfreq'],
+            'channel_names': list(raw.ch_names),
+            'n_times': raw.n_times
+        }
+        raw.close()
+        return info
+    
+    @staticmethod
+    def _sample_bounds(chunk_info: ChunkInfo, sfreq: float, n_times: int) -> Tuple[int, int]:
+        if chunk_info.start_sample is not None and chunk_info.stop_sample is not None:
+            return min(chunk_info.start_sample, n_times), min(chunk_info.stop_sample, n_times)
+        
+        # Mesma semântica do raw.crop(tmin, tmax): tmax inclusivo
+        start = min(max(int(round(chunk_info.start_time * sfreq)), 0), n_times)
+        stop = min(max(int(round(chunk_info.end_time * sfreq)) + 1, start), n_times)
+        return start, stop
+    
+    @staticmethod
+    def get_chunk_data(file_path: str, chunk_info: ChunkInfo, channels: Optional[List[str]] = None,
+                       dtype=None) -> Dict:
+        """
+        dtype=None: precisão nativa (float32 do sample store, sem cópia) ou
+        EEG_DTYPE na leitura do EDF. Um dtype explícito converte os dois casos.
+        """
         try:
-            raw = mne.io.read_raw_edf(file_path, preload=True, verbose=False)
-            raw.crop(tmin=chunk_info.start_time, tmax=chunk_info.end_time)
-            available_channels = raw.ch_names
-            channels_to_plot = available_channels
+            store = sample_store.open(file_path)
+            if store is not None:
+                chunk = ChunkManager._get_chunk_data_from_store(store, chunk_info, channels)
+                if dtype is not None:
+                    chunk['data'] = chunk['data'].astype(resolve_dtype(dtype), copy=False)
+                return chunk
             
-            if channels:
-                valid_channels = [ch for ch in channels if ch in available_channels]
-                if valid_channels:
-                    channels_to_plot = valid_channels
-                    raw.pick(valid_channels)
-                else:
-                    channels_to_plot = available_channels
+            edf_info = ChunkManager.read_edf_info(file_path)
+            available_channels = edf_info['channel_names']
+            channels_to_plot = ChunkManager._select_channels(available_channels, channels)
             
-            data, times = raw.get_data(return_times=True)
+            # preload=False + include: o MNE lê do disco apenas os data records que
+            # cobrem [start, stop) e só decodifica os canais selecionados
+            raw = mne.io.read_raw_edf(file_path, include=channels_to_plot, preload=False, verbose=False)
+            sample_rate = raw.info['sfreq']
+            start, stop = ChunkManager._sample_bounds(chunk_info, sample_rate, raw.n_times)
+            data, times = raw.get_data(
+                picks=channels_to_plot,
+                start=start,
+                stop=stop,
+                return_times=True
+            )
             
             raw.close()
             
             return {
-                'data': data,
+                'data': data.astype(resolve_dtype(dtype), copy=False),
                 'times': times,
                 'channel_names': channels_to_plot,  
-                'sample_rate': raw.info['sfreq'],
+                'sample_rate': sample_rate,
                 'n_samples': data.shape[1],
                 'original_channels': available_channels 
             }
@@ -95,6 +181,85 @@ class ChunkManager:
         except Exception as e:
             raise RuntimeError(f"Erro ao ler chunk do EDF: {str(e)}")
     
+    @staticmethod
+    def _get_chunk_data_from_store(store: Dict, chunk_info: ChunkInfo, channels: Optional[List[str]]) -> Dict:
+        available_channels = store['channel_names']
+        channels_to_plot = ChunkManager._select_channels(available_channels, channels)
+        channel_indices = [available_channels.index(ch) for ch in channels_to_plot]
+        
+        sample_rate = store['sample_rate']
+        start, stop = ChunkManager._sample_bounds(chunk_info, sample_rate, store['n_times'])
+        data = sample_store.read_window(store, start, stop, channel_indices)
+        
+        return {
+            'data': data,
+            'times': np.arange(start, stop) / sample_rate,
+            'channel_names': channels_to_plot,
+            'sample_rate': sample_rate,
+            'n_samples': data.shape[1],
+            'original_channels': available_channels
+        }
+    
+    @staticmethod
+    def get_chunk_envelope(file_path: str, chunk_info: ChunkInfo, n_pixels: int,
+                           channels: Optional[List[str]] = None) -> Dict:
+        """
+        Envelope (min, max) do chunk no nível mais grosso da pirâmide que ainda
+        tem pelo menos um bucket por pixel. Nível 0 significa resolução total.
+        """
+        try:
+            store = sample_store.open(file_path)
+            if store is not None:
+                available_channels = store['channel_names']
+                channels_to_plot = ChunkManager._select_channels(available_channels, channels)
+                sample_rate = store['sample_rate']
+                start, stop = ChunkManager._sample_bounds(chunk_info, sample_rate, store['n_times'])
+                level = select_level(stop - start, n_pixels, store['pyramid_levels'])
+                
+                if level > 0:
+                    channel_indices = [available_channels.index(ch) for ch in channels_to_plot]
+                    bucket_size = 1 << level
+                    first_bucket, last_bucket = start // bucket_size, -(-stop // bucket_size)
+                    window = store['levels'][level][channel_indices, first_bucket:last_bucket]
+                    
+                    return {
+                        'data_min': window[..., 0],
+                        'data_max': window[..., 1],
+                        'times': np.arange(first_bucket, last_bucket) * bucket_size / sample_rate,
+                        'level': level,
+                        'bucket_size': bucket_size,
+                        'channel_names': channels_to_plot,
+                        'sample_rate': sample_rate,
+                        'original_channels': available_channels
+                    }
+        except Exception as e:
+            raise RuntimeError(f"Erro ao ler envelope do EDF: {str(e)}")
+        
+        # Sem pirâmide em disco: lê em resolução total e reduz em memória
+        chunk_data = ChunkManager.get_chunk_data(file_path, chunk_info, channels)
+        level = select_level(chunk_data['n_samples'], n_pixels, max_level=32)
+        bucket_size = 1 << level
+        data_min, data_max = envelope(chunk_data['data'], level)
+        
+        return {
+            'data_min': data_min,
+            'data_max': data_max,
+            'times': chunk_data['times'][::bucket_size],
+            'level': level,
+            'bucket_size': bucket_size,
+            'channel_names': chunk_data['channel_names'],
+            'sample_rate': chunk_data['sample_rate'],
+            'original_channels': chunk_data['original_channels']
+        }
+    
+    @staticmethod
+    def _select_channels(available_channels: List[str], channels: Optional[List[str]]) -> List[str]:
+        if channels:
+            valid_channels = [ch for ch in channels if ch in available_channels]
+            if valid_channels:
+                return valid_channels
+        return list(available_channels)
+    
     @staticmethod
     def validate_edf_file(file_path: str) -> bool:
         try:
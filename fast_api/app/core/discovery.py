@@ -0,0 +1,197 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .chunks import chunk_manager
+from .models import EDFDiscoveryDir, EDFDiscoveryEntry
+
+logger = logging.getLogger(__name__)
+
+DISCOVERY_REFRESH_SECONDS = float(os.getenv("DISCOVERY_REFRESH_SECONDS", "30"))
+DISCOVERY_WORKERS = int(os.getenv("DISCOVERY_WORKERS", "4"))
+# Tentativas quando outro worker grava as mesmas linhas no mesmo refresh
+DISCOVERY_REFRESH_RETRIES = int(os.getenv("DISCOVERY_REFRESH_RETRIES", "3"))
+
+
+def _read_header(file_path: str) -> Dict:
+    try:
+        info = chunk_manager.read_edf_info(file_path)
+        return {
+            "channels": info["n_channels"],
+            "sample_frequency": float(info["sample_rate"]),
+            "duration": float(info["duration"]),
+            "channel_names": list(info["channel_names"]),
+            "error": None,
+        }
+    except Exception as e:
+        return {"channels": None, "sample_frequency": None, "duration": None,
+                "channel_names": [], "error": str(e)}
+
+
+class DiscoveryIndex:
+    """
+    Índice persistente (tabelas edf_discovery_*) dos EDFs sob a pasta de dados.
+    O refresh é incremental: diretórios com o mesmo mtime não são listados de
+    novo, arquivos com o mesmo (size, mtime) não são relidos, e só os
+    cabeçalhos de arquivos novos ou alterados são lidos, em paralelo.
+    """
+
+    def __init__(self, refresh_seconds: float = DISCOVERY_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._last_refresh = {}
+        self._lock = threading.Lock()
+
+    def refresh(self, db: Session, data_dir: Path, force: bool = False) -> Dict[str, int]:
+        root = str(Path(data_dir))
+        with self._lock:
+            last = self._last_refresh.get(root)
+            if not force and last is not None and time.monotonic() - last < self.refresh_seconds:
+                return {"scanned_dirs": 0, "parsed_files": 0, "removed_files": 0}
+            for attempt in range(DISCOVERY_REFRESH_RETRIES):
+                try:
+                    stats = self._refresh(db, root)
+                    break
+                except IntegrityError:
+                    # Outro processo (worker uvicorn) inseriu as mesmas chaves
+                    # primeiro: relê o índice já atualizado e aplica só a diferença
+                    db.rollback()
+                    if attempt == DISCOVERY_REFRESH_RETRIES - 1:
+                        raise
+                    logger.info(f"Refresh concorrente do índice de descoberta em {root}, repetindo")
+            self._last_refresh[root] = time.monotonic()
+            return stats
+
+    def _refresh(self, db: Session, root: str) -> Dict[str, int]:
+        known_dirs = {
+            d.path: d for d in db.query(EDFDiscoveryDir).filter(
+                (EDFDiscoveryDir.path == root) | EDFDiscoveryDir.path.startswith(root + os.sep, autoescape=True)
+            )
+        }
+        entries = {
+            e.file_path: e for e in db.query(EDFDiscoveryEntry).filter(
+                EDFDiscoveryEntry.file_path.startswith(root + os.sep, autoescape=True)
+            )
+        }
+        children = {}
+        for d in known_dirs.values():
+            children.setdefault(d.parent_path, []).append(d.path)
+        files_by_dir = {}
+        for e in entries.values():
+            files_by_dir.setdefault(e.dir_path, []).append(e.file_path)
+
+        seen_dirs, seen_files = set(), set()
+        candidates = []  # (file_path, dir_path, stat) novos ou alterados
+        scanned = 0
+        stack = [(root, None)] if os.path.isdir(root) else []
+
+        while stack:
+            dir_path, parent = stack.pop()
+            try:
+                dir_mtime = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                continue
+            seen_dirs.add(dir_path)
+            known = known_dirs.get(dir_path)
+
+            if known is not None and known.mtime_ns == dir_mtime:
+                # Listagem inalterada: reaproveita subdiretórios/arquivos do índice
+                stack.extend((child, dir_path) for child in children.get(dir_path, []))
+                file_paths = files_by_dir.get(dir_path, [])
+            else:
+                scanned += 1
+                file_paths = []
+                subdirs = []
+                try:
+                    with os.scandir(dir_path) as it:
+                        for item in it:
+                            if item.is_dir(follow_symlinks=False):
+                                subdirs.append((item.path, dir_path))
+                            elif item.is_file() and item.name.lower().endswith(".edf"):
+                                file_paths.append(item.path)
+                except OSError as e:
+                    # Removido ou sem permissão durante a varredura: sai do índice
+                    logger.warning(f"Diretório ignorado na descoberta {dir_path}: {e}")
+                    seen_dirs.discard(dir_path)
+                    continue
+                stack.extend(subdirs)
+                if known is None:
+                    db.add(EDFDiscoveryDir(path=dir_path, parent_path=parent, mtime_ns=dir_mtime))
+                else:
+                    known.mtime_ns = dir_mtime
+                    known.parent_path = parent
+
+            for file_path in file_paths:
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                seen_files.add(file_path)
+                entry = entries.get(file_path)
+                if entry is None or entry.file_size != stat.st_size or entry.mtime_ns != stat.st_mtime_ns:
+                    candidates.append((file_path, dir_path, stat))
+
+        if candidates:
+            with ThreadPoolExecutor(max_workers=DISCOVERY_WORKERS) as pool:
+                headers = list(pool.map(_read_header, [c[0] for c in candidates]))
+            for (file_path, dir_path, stat), header in zip(candidates, headers):
+                entry = entries.get(file_path)
+                if entry is None:
+                    entry = EDFDiscoveryEntry(file_path=file_path)
+                    db.add(entry)
+                entry.dir_path = dir_path
+                entry.file_name = os.path.basename(file_path)
+                entry.file_size = stat.st_size
+                entry.mtime_ns = stat.st_mtime_ns
+                for field, value in header.items():
+                    setattr(entry, field, value)
+
+        removed = [path for path in entries if path not in seen_files]
+        for path in removed:
+            db.delete(entries[path])
+        for path, d in known_dirs.items():
+            if path not in seen_dirs:
+                db.delete(d)
+
+        db.commit()
+        if candidates or removed:
+            logger.info(
+                f"Índice de descoberta atualizado: {len(candidates)} lidos, "
+                f"{len(removed)} removidos, {scanned} diretórios listados"
+            )
+        return {"scanned_dirs": scanned, "parsed_files": len(candidates), "removed_files": len(removed)}
+
+    @staticmethod
+    def list_files(db: Session, data_dir: Path, skip: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        root = str(Path(data_dir))
+        query = (
+            db.query(EDFDiscoveryEntry)
+            .filter(EDFDiscoveryEntry.file_path.startswith(root + os.sep, autoescape=True))
+            .order_by(EDFDiscoveryEntry.file_path)
+            .offset(skip)
+        )
+        if limit is not None:
+            query = query.limit(limit)
+
+        return [
+            {
+                "path": e.file_path,
+                "name": e.file_name,
+                "size": e.file_size,
+                "channels": e.channels,
+                "channel_names": e.channel_names,
+                "sfreq": e.sample_frequency,
+                "duration": e.duration,
+                "error": e.error,
+            }
+            for e in query
+        ]
+
+
+discovery_index = DiscoveryIndex()
@@ -0,0 +1,55 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+
+EDF_INFO_CACHE_SIZE = int(os.getenv("EDF_INFO_CACHE_SIZE", "512"))
+
+
+def file_fingerprint(file_path: str) -> Tuple[str, int, int]:
+    # (path, size, mtime) muda sempre que o arquivo é reescrito
+    stat = os.stat(file_path)
+    return os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns
+
+
+class EDFInfoCache:
+    """
+    Cache LRU, compartilhado pelo processo, dos metadados de cabeçalho dos EDFs
+    (canais, sfreq, n_times, duração). Cada entrada guarda o fingerprint
+    (path, size, mtime) do arquivo e é recarregada quando ele muda.
+    """
+
+    def __init__(self, max_size: int = EDF_INFO_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_load(self, file_path: str, loader: Callable[[str], Dict]) -> Dict:
+        fingerprint = file_fingerprint(file_path)
+        path = fingerprint[0]
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry[0] == fingerprint:
+                self._entries.move_to_end(path)
+                return dict(entry[1])
+
+        info = loader(file_path)
+
+        with self._lock:
+            self._entries.pop(path, None)
+            if len(self._entries) >= self.max_size:
+                self._entries.popitem(last=False)
+            self._entries[path] = (fingerprint, info)
+
+        return dict(info)
+
+    def invalidate(self, file_path: str = None):
+        with self._lock:
+            if file_path:
+                self._entries.pop(os.path.abspath(file_path), None)
+            else:
+                self._entries.clear()
+
+
+edf_info_cache = EDFInfoCache()
@@ -4,7 +4,10 @@ from enum import Enum
 class ProcessingStatus(str, Enum):
     NEW = "new"
     ACTIVE = "active"
+    HEADER_VALIDATED = "header_validated"
+    VALIDATING = "validating"
     VALIDATED = "validated"
+    INVALID = "invalid"
     FILTERED = "filtered"
     DELETED = "deleted"
     trials_created = "TRIALS_CREATED"
@@ -0,0 +1,84 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+EEG_WORKER_THREADS = int(os.getenv("EEG_WORKER_THREADS", str(min(8, (os.cpu_count() or 1) + 2))))
+# Processos para renders em lote (matplotlib não paraleliza entre threads)
+EEG_PROCESS_WORKERS = int(os.getenv("EEG_PROCESS_WORKERS", str(os.cpu_count() or 1)))
+
+# Limite de execuções simultâneas por tipo de operação (dentro do pool)
+EEG_OPERATION_LIMITS = {
+    "read": int(os.getenv("EEG_READ_CONCURRENCY", "4")),
+    # Renders thread-safe (raster, tiles, heatmaps, hits de cache)
+    "render": int(os.getenv("EEG_RENDER_CONCURRENCY", str(EEG_WORKER_THREADS))),
+    # pyplot usa estado global: renders matplotlib em série por padrão
+    "render_matplotlib": int(os.getenv("EEG_MATPLOTLIB_CONCURRENCY", "1")),
+}
+
+
+class EEGExecutor:
+    """
+    Pool de threads compartilhado para o trabalho bloqueante de EEG (MNE,
+    numpy, matplotlib) chamado dentro de endpoints async. Cada operação tem
+    seu próprio semáforo, então renders lentos não consomem o pool inteiro
+    e o event loop do uvicorn continua livre para outras requisições.
+    """
+
+    def __init__(self, max_workers: int = EEG_WORKER_THREADS, limits: Optional[Dict[str, int]] = None,
+                 process_workers: int = EEG_PROCESS_WORKERS):
+        self.max_workers = max_workers
+        self.limits = dict(limits or EEG_OPERATION_LIMITS)
+        self.process_workers = process_workers
+        self._pool = None
+        self._process_pool = None
+        self._semaphores = {}
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="eeg")
+        return self._pool
+
+    @property
+    def process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            # spawn: fork de um processo com threads (uvicorn, pools) pode herdar locks travados
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=max(1, self.process_workers),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._process_pool
+
+    def _semaphore(self, operation: str) -> asyncio.Semaphore:
+        if operation not in self._semaphores:
+            limit = self.limits.get(operation, self.max_workers)
+            self._semaphores[operation] = asyncio.Semaphore(max(1, limit))
+        return self._semaphores[operation]
+
+    async def run(self, operation: str, fn: Callable, *args, **kwargs):
+        async with self._semaphore(operation):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.pool, functools.partial(fn, *args, **kwargs))
+
+    async def run_in_process(self, fn: Callable, *args, **kwargs):
+        """Executa `fn` (função de módulo, argumentos picklable) no pool de processos."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.process_pool, functools.partial(fn, *args, **kwargs))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+        self._semaphores.clear()
+
+
+eeg_executor = EEGExecutor()
@@ -1,22 +1,26 @@
 # core/features.py
 import numpy as np
+from scipy.integrate import trapezoid
 from scipy.signal import welch
 from app.core.models import Trial as TrialModel, EDFFile as EDFFileModel
 from app.core.database import SessionLocal
+from app.core.precision import resolve_dtype
 
 
-def extract_features_from_signal(signal, fs):
+def extract_features_from_signal(signal, fs, dtype=None):
     """
     Extrai features simples para o KNN.
     Você pode expandir depois.
+    dtype: precisão do sinal no cálculo (padrão: EEG_DTYPE).
     """
+    signal = np.asarray(signal, dtype=resolve_dtype(dtype))
 
-    # PSD com Welch
+    # PSD com Welch (em float32 o scipy mantém float32)
     freqs, psd = welch(signal, fs=fs)
 
     def bandpower(low, high):
         idx = np.logical_and(freqs >= low, freqs <= high)
-        return float(np.trapz(psd[idx], freqs[idx]))
+        return float(trapezoid(psd[idx], freqs[idx]))
 
     return {
         "delta": bandpower(0.5, 4),
@@ -24,8 +28,8 @@ def extract_features_from_signal(signal, fs):
         "alpha": bandpower(8, 13),
         "beta": bandpower(13, 30),
         "gamma": bandpower(30, 45),
-        "mean": float(np.mean(signal)),
-        "std": float(np.std(signal)),
+        "mean": float(np.mean(signal, dtype=np.float64)),
+        "std": float(np.std(signal, dtype=np.float64)),
     }
 
 
@@ -1,15 +1,41 @@
 import mne
 import logging
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
 
 # ---------- HELPERS ----------
+def _is_float32(raw: mne.io.BaseRaw) -> bool:
+    return raw.preload and raw._data.dtype == np.float32
+
+
+def _filter_float32(raw: mne.io.BaseRaw, fun):
+    # Os filtros do MNE só aceitam float64: converte um canal por vez e grava
+    # o resultado de volta na matriz float32 (sem cópia float64 da gravação).
+    # picks="data" como raw.filter/notch_filter: stim e misc ficam intactos
+    raw.apply_function(lambda x: fun(x.astype(np.float64)), picks="data", channel_wise=True)
+
+
 def apply_notch(raw: mne.io.BaseRaw, freqs: list[float]):
+    if _is_float32(raw):
+        sfreq = raw.info["sfreq"]
+        _filter_float32(raw, lambda x: mne.filter.notch_filter(x, sfreq, freqs, verbose=False))
+        return raw
     raw.notch_filter(freqs=freqs)
     return raw
 
 def apply_bandpass(raw: mne.io.BaseRaw, l_freq: float, h_freq: float):
+    if _is_float32(raw):
+        sfreq = raw.info["sfreq"]
+        _filter_float32(raw, lambda x: mne.filter.filter_data(x, sfreq, l_freq, h_freq, verbose=False))
+        # Mesma atualização de info que raw.filter faz
+        with raw.info._unlock():
+            if l_freq is not None and l_freq > (raw.info["highpass"] or 0):
+                raw.info["highpass"] = float(l_freq)
+            if h_freq is not None and h_freq < (raw.info["lowpass"] or np.inf):
+                raw.info["lowpass"] = float(h_freq)
+        return raw
     raw.filter(l_freq=l_freq, h_freq=h_freq)
     return raw
 
@@ -81,3 +81,28 @@ class ClassificationResult(Base):
 
     trial = relationship("Trial")
 
+
+class EDFDiscoveryDir(Base):
+    __tablename__ = "edf_discovery_dirs"
+
+    path = Column(Text, primary_key=True)
+    parent_path = Column(Text, index=True)
+    mtime_ns = Column(BigInteger, nullable=False)
+    updated_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+
+
+class EDFDiscoveryEntry(Base):
+    __tablename__ = "edf_discovery_index"
+
+    file_path = Column(Text, primary_key=True)
+    dir_path = Column(Text, nullable=False, index=True)
+    file_name = Column(String(255), nullable=False)
+    file_size = Column(BigInteger, nullable=False)
+    mtime_ns = Column(BigInteger, nullable=False)
+    channels = Column(SmallInteger)
+    sample_frequency = Column(Float)
+    duration = Column(Float)
+    channel_names = Column(JSONB, nullable=False, server_default=text("'[]'::jsonb"))
+    error = Column(Text)
+    updated_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+
@@ -0,0 +1,258 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_CONTAINER_PATH = Path(os.getenv("OUTPUT_CONTAINER_PATH", "/tmp/output"))
+PLOT_CACHE_PATH = Path(os.getenv("PLOT_CACHE_PATH", str(OUTPUT_CONTAINER_PATH / "plots")))
+PLOT_CACHE_MAX_BYTES = int(os.getenv("PLOT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Outros workers também escrevem no cache: recontagem do disco no máximo a cada N s
+PLOT_CACHE_SCAN_SECONDS = float(os.getenv("PLOT_CACHE_SCAN_SECONDS", "60"))
+
+OBJECTS_DIR = "objects"
+# Formatos derivados do PNG guardados ao lado dele
+ENCODED_SUFFIXES = (".webp",)
+INDEX_DIR = "index"
+GENERATIONS_DIR = "generations"
+LOCKS_DIR = "locks"
+
+
+class PlotCache:
+    """
+    Cache de plots em disco, compartilhado entre os workers do uvicorn e
+    preservado entre reinícios. Cada render é endereçado pela sua chave
+    (hash da visualização + fingerprint do EDF) e gravado como
+    objects/<kk>/<key>.png + <key>.json, com escrita atômica (arquivo
+    temporário + os.replace, json por último); outros formatos já codificados
+    (<key>.webp) ficam ao lado do PNG e saem junto com ele. index/<arquivo>/<key> lista as
+    chaves de cada EDF para a invalidação por arquivo. generations/<arquivo>
+    (e generations/all) são contadores incrementados a cada invalidação e
+    entram na chave dos plots: a invalidação feita por um worker muda as chaves
+    em todos, inclusive nas caches em memória. O mtime do .png marca o
+    último acesso e a remoção segue LRU até caber em PLOT_CACHE_MAX_BYTES.
+    """
+
+    def __init__(self, root: Path = PLOT_CACHE_PATH, max_bytes: int = PLOT_CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._approx_bytes = None
+        self._last_scan = 0.0
+
+    # ---------- CAMINHOS ----------
+    def _object_path(self, key: str, suffix: str) -> Path:
+        return self.root / OBJECTS_DIR / key[:2] / f"{key}{suffix}"
+
+    def _index_dir(self, file_path: str) -> Path:
+        digest = hashlib.sha1(os.path.abspath(file_path).encode()).hexdigest()[:16]
+        return self.root / INDEX_DIR / digest
+
+    def _generation_path(self, file_path: Optional[str] = None) -> Path:
+        name = "all" if file_path is None else self._index_dir(file_path).name
+        return self.root / GENERATIONS_DIR / name
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes):
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+    # ---------- LEITURA / ESCRITA ----------
+    def get(self, key: str) -> Optional[Dict]:
+        png_path = self._object_path(key, ".png")
+        try:
+            meta = json.loads(self._object_path(key, ".json").read_text())
+            png = png_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(png_path)
+        except OSError:
+            pass
+        return {"png": png, "channels_plotted": meta["channels_plotted"]}
+
+    def get_encoded(self, key: str, image_format: str) -> Optional[bytes]:
+        try:
+            return self._object_path(key, f".{image_format}").read_bytes()
+        except OSError:
+            return None
+
+    def put_encoded(self, key: str, image_format: str, content: bytes):
+        """Grava uma versão já codificada (ex.: WebP) de um PNG presente no cache."""
+        if not self.contains(key):
+            return
+        try:
+            self._write_atomic(self._object_path(key, f".{image_format}"), content)
+        except OSError as e:
+            logger.warning(f"Falha ao gravar plot {image_format} no cache em disco: {e}")
+            return
+        with self._lock:
+            if self._approx_bytes is not None:
+                self._approx_bytes += len(content)
+
+    def contains(self, key: str) -> bool:
+        return self._object_path(key, ".json").exists()
+
+    def put(self, key: str, file_path: str, png: bytes, channels_plotted):
+        try:
+            png_path = self._object_path(key, ".png")
+            png_path.parent.mkdir(parents=True, exist_ok=True)
+            index_dir = self._index_dir(file_path)
+            index_dir.mkdir(parents=True, exist_ok=True)
+
+            self._write_atomic(png_path, png)
+            meta = {"file_path": os.path.abspath(file_path), "channels_plotted": list(channels_plotted)}
+            self._write_atomic(self._object_path(key, ".json"), json.dumps(meta).encode())
+            (index_dir / key).touch()
+        except OSError as e:
+            logger.warning(f"Falha ao gravar plot no cache em disco: {e}")
+            return
+
+        with self._lock:
+            if self._approx_bytes is not None:
+                self._approx_bytes += len(png)
+            needs_scan = (
+                self._approx_bytes is None
+                or self._approx_bytes > self.max_bytes
+                or time.monotonic() - self._last_scan > PLOT_CACHE_SCAN_SECONDS
+            )
+        if needs_scan:
+            self._evict()
+
+    @contextmanager
+    def lock(self, key: str):
+        """
+        Lock exclusivo entre processos para renderizar `key`. Usa 256 arquivos
+        fixos (prefixo da chave) para não acumular arquivos de lock.
+        """
+        lock_dir = self.root / LOCKS_DIR
+        lock_dir.mkdir(parents=True, exist_ok=True)
+        with open(lock_dir / f"{key[:2]}.lock", "a") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    # ---------- INVALIDAÇÃO ----------
+    @staticmethod
+    def _read_generation(path: Path) -> int:
+        try:
+            return int(path.read_text())
+        except (OSError, ValueError):
+            return 0
+
+    def generation(self, file_path: str) -> str:
+        """'<global>.<arquivo>': muda a cada invalidação, em qualquer worker."""
+        return (
+            f"{self._read_generation(self._generation_path())}."
+            f"{self._read_generation(self._generation_path(file_path))}"
+        )
+
+    def _bump_generation(self, file_path: Optional[str] = None):
+        path = self._generation_path(file_path)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path.with_name(f"{path.name}.lock"), "a") as handle:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                self._write_atomic(path, str(self._read_generation(path) + 1).encode())
+        except OSError as e:
+            logger.warning(f"Falha ao registrar invalidação do cache de plots: {e}")
+
+    def _remove(self, key: str):
+        """Remove o objeto e o seu marcador em index/ (o json diz de qual EDF é)."""
+        try:
+            meta = json.loads(self._object_path(key, ".json").read_text())
+            marker = self._index_dir(meta["file_path"]) / key
+        except (OSError, ValueError, KeyError):
+            marker = None
+        for suffix in (".json", ".png") + ENCODED_SUFFIXES:
+            try:
+                self._object_path(key, suffix).unlink()
+            except FileNotFoundError:
+                pass
+        if marker is not None:
+            marker.unlink(missing_ok=True)
+
+    def invalidate(self, file_path: Optional[str] = None) -> int:
+        """Remove os plots de um EDF (ou todos). Retorna quantos foram removidos."""
+        # Antes da remoção: renders novos já usam chaves da nova geração
+        self._bump_generation(file_path)
+        if file_path is None:
+            removed = 0
+            objects_dir = self.root / OBJECTS_DIR
+            if objects_dir.exists():
+                for json_path in objects_dir.glob("*/*.json"):
+                    self._remove(json_path.stem)
+                    removed += 1
+            index_root = self.root / INDEX_DIR
+            if index_root.exists():
+                for marker in index_root.glob("*/*"):
+                    marker.unlink(missing_ok=True)
+            with self._lock:
+                self._approx_bytes = None
+            return removed
+
+        index_dir = self._index_dir(file_path)
+        if not index_dir.exists():
+            return 0
+        removed = 0
+        for marker in index_dir.iterdir():
+            self._remove(marker.name)
+            marker.unlink(missing_ok=True)
+            removed += 1
+        with self._lock:
+            self._approx_bytes = None
+        return removed
+
+    def _evict(self):
+        """Recalcula o tamanho em disco e remove os menos usados até caber no limite."""
+        objects_dir = self.root / OBJECTS_DIR
+        entries = []
+        total = 0
+        for png_path in objects_dir.glob("*/*.png"):
+            try:
+                stat = png_path.stat()
+            except OSError:
+                continue
+            size = stat.st_size
+            for suffix in ENCODED_SUFFIXES:
+                try:
+                    size += png_path.with_suffix(suffix).stat().st_size
+                except OSError:
+                    pass
+            entries.append((stat.st_mtime_ns, size, png_path.stem))
+            total += size
+
+        removed = 0
+        if total > self.max_bytes:
+            # Desce até 90% do limite para não varrer o disco a cada put
+            target = int(self.max_bytes * 0.9)
+            entries.sort()
+            for _, size, key in entries:
+                if total <= target:
+                    break
+                self._remove(key)
+                total -= size
+                removed += 1
+            if removed:
+                logger.info(f"Cache de plots: {removed} renders removidos (LRU)")
+
+        with self._lock:
+            self._approx_bytes = total
+            self._last_scan = time.monotonic()
+
+
+plot_cache = PlotCache()
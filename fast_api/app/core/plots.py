@@ -1,18 +1,142 @@
 import base64
+import logging
+from io import BytesIO
+import os
+import threading
 from typing import Dict, List, Optional
 from collections import OrderedDict
-from io import BytesIO
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+from concurrent.futures import Future, ThreadPoolExecutor
 import numpy as np
+from PIL import Image
 
 from .chunks import ChunkInfo, chunk_manager
+from .edf_cache import file_fingerprint
+from .plot_cache import plot_cache
+from .pyramid import interleave
+from .renderers import renderers
+
+logger = logging.getLogger(__name__)
+
+# "next" (n+1), "both" (n+1 e n-1) ou "none"
+PLOT_PREFETCH_NEIGHBORS = os.getenv("PLOT_PREFETCH_NEIGHBORS", "next")
+PLOT_PREFETCH_WORKERS = int(os.getenv("PLOT_PREFETCH_WORKERS", "1"))
+PLOT_PREFETCH_MAX_PENDING = int(os.getenv("PLOT_PREFETCH_MAX_PENDING", "4"))
+# "matplotlib" (padrão) ou "raster" (NumPy + PIL, dezenas de ms)
+EEG_PLOT_RENDERER = os.getenv("EEG_PLOT_RENDERER", "matplotlib")
+# "minmax" (envelope por bucket) ou "lttb" (Largest-Triangle-Three-Buckets)
+PLOT_DECIMATION = os.getenv("PLOT_DECIMATION", "minmax")
+# Cache em memória (por processo) na frente do cache em disco compartilhado
+PLOT_MEMORY_CACHE_BYTES = int(os.getenv("PLOT_MEMORY_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+IMAGE_MEDIA_TYPES = {"png": "image/png", "webp": "image/webp"}
+
+# Visões de baixa resolução geradas na ingestão (todos os chunks + miniatura da gravação)
+PLOT_OVERVIEW_VIEW = {
+    "width": int(os.getenv("PLOT_OVERVIEW_WIDTH", "400")),
+    "height": int(os.getenv("PLOT_OVERVIEW_HEIGHT", "200")),
+    "channels": None,
+    "target_samples": None,
+    "renderer": os.getenv("PLOT_OVERVIEW_RENDERER", "raster"),
+    "decimation": "minmax",
+}
+# Prioridade (nice) das threads de overview: cedem CPU às requisições
+PLOT_OVERVIEW_NICE = int(os.getenv("PLOT_OVERVIEW_NICE", "10"))
+
+
+def _lower_thread_priority():
+    try:
+        # No Linux cada thread tem seu próprio nice (PRIO_PROCESS com o tid)
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), PLOT_OVERVIEW_NICE)
+    except (AttributeError, OSError):
+        pass
+
+
+# ---------- DECIMAÇÃO ----------
+def decimate_minmax(times: np.ndarray, data: np.ndarray, n_out: int):
+    """
+    Reduz (n_channels, n_samples) a no máximo n_out pontos por canal: n_out/2
+    buckets, cada um vira o par (min, max). Todos os canais de uma vez.
+    """
+    n_samples = data.shape[-1]
+    n_buckets = n_out // 2
+    if n_buckets < 1 or n_samples <= n_out:
+        return times, data
+    starts = np.linspace(0, n_samples, n_buckets + 1).astype(np.int64)[:-1]
+    data_min = np.minimum.reduceat(data, starts, axis=-1)
+    data_max = np.maximum.reduceat(data, starts, axis=-1)
+    return interleave(data_min, data_max, times[starts])
+
+
+def decimate_lttb(times: np.ndarray, data: np.ndarray, n_out: int):
+    """
+    Largest-Triangle-Three-Buckets: mantém o primeiro e o último ponto e, em
+    cada bucket intermediário, o ponto que forma o maior triângulo com o
+    ponto escolhido no bucket anterior e a média do próximo. Os buckets são
+    percorridos em sequência, mas cada passo é vetorizado sobre os canais.
+
+    Como cada canal escolhe amostras diferentes, os tempos retornados têm a
+    mesma forma dos dados, (n_channels, n_out).
+    """
+    n_channels, n_samples = data.shape
+    if n_out < 3 or n_samples <= n_out:
+        return times, data
+    
+    # n_out - 2 buckets sobre as amostras internas [1, n_samples - 1)
+    edges = np.linspace(1, n_samples - 1, n_out - 1).astype(np.int64)
+    counts = np.diff(edges)
+    inner = data[:, 1:n_samples - 1]
+    avg_values = np.add.reduceat(inner, edges[:-1] - 1, axis=1) / counts
+    avg_times = np.add.reduceat(times[1:n_samples - 1], edges[:-1] - 1) / counts
+    # "Próximo" do último bucket é o último ponto
+    next_values = np.concatenate([avg_values[:, 1:], data[:, -1:]], axis=1)
+    next_times = np.append(avg_times[1:], times[-1])
+    
+    rows = np.arange(n_channels)
+    indices = np.empty((n_channels, n_out), dtype=np.int64)
+    indices[:, 0] = 0
+    indices[:, -1] = n_samples - 1
+    prev_t = np.full(n_channels, times[0], dtype=np.float64)
+    prev_v = data[:, 0].astype(np.float64)
+    
+    for i in range(n_out - 2):
+        a, b = edges[i], edges[i + 1]
+        bucket_t = times[a:b]
+        bucket_v = data[:, a:b]
+        area = np.abs(
+            (prev_t - next_times[i])[:, None] * (bucket_v - prev_v[:, None])
+            - (prev_t[:, None] - bucket_t[None, :]) * (next_values[:, i] - prev_v)[:, None]
+        )
+        best = area.argmax(axis=1)
+        indices[:, i + 1] = a + best
+        prev_t = bucket_t[best]
+        prev_v = bucket_v[rows, best]
+    
+    return times[indices], np.take_along_axis(data, indices, axis=1)
+
+
+DECIMATORS = {
+    "minmax": decimate_minmax,
+    "lttb": decimate_lttb,
+}
 
 class EEGPlotGenerator:
-    def __init__(self, max_cache_size: int = 100):
+    def __init__(self, max_cache_size: int = 100, max_cache_bytes: int = PLOT_MEMORY_CACHE_BYTES,
+                 disk_cache=plot_cache):
         self.png_cache = OrderedDict()
         self.max_cache_size = max_cache_size
+        self.max_cache_bytes = max_cache_bytes
+        self.disk_cache = disk_cache
+        self._cache_bytes = 0
+        self._cache_lock = threading.Lock()
+        self._prefetch_lock = threading.Lock()
+        self._prefetch_pool = None
+        self._prefetches = {}
+        self._overview_pool = None
+        self._overviews = {}
+        # Single-flight: renders em andamento por chave de cache
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'coalesced': 0}
     
     def generate_chunk_plot(
         self, 
@@ -20,16 +144,182 @@ class EEGPlotGenerator:
         chunk_info: ChunkInfo,
         width: int = 800,
         height: int = 400,
-        channels: Optional[List[str]] = None
+        channels: Optional[List[str]] = None,
+        target_samples: Optional[int] = None,
+        renderer: Optional[str] = None,
+        decimation: Optional[str] = None
     ) -> Dict:
-        cache_key = self._generate_cache_key(file_path, chunk_info.chunk_index, width, height, channels)
+        _, entry = self._get_or_render(
+            file_path, chunk_info, width, height, channels, target_samples, renderer, decimation
+        )
+        png_base64 = base64.b64encode(entry['png']).decode('utf-8')
         
-        if cache_key in self.png_cache:
-            return self.png_cache[cache_key]
+        return {
+            'png_data': f"data:image/png;base64,{png_base64}",
+            'channels_plotted': entry['channels_plotted']
+        }
+    
+    def generate_chunk_image(
+        self,
+        file_path: str,
+        chunk_info: ChunkInfo,
+        width: int = 800,
+        height: int = 400,
+        channels: Optional[List[str]] = None,
+        target_samples: Optional[int] = None,
+        renderer: Optional[str] = None,
+        decimation: Optional[str] = None,
+        image_format: str = "png"
+    ) -> Dict:
+        """Bytes da imagem (PNG ou WebP) com o ETag da renderização."""
+        cache_key, entry = self._get_or_render(
+            file_path, chunk_info, width, height, channels, target_samples, renderer, decimation
+        )
+        content = entry['png'] if image_format == "png" else self._encoded(cache_key, entry, image_format)
         
-        result = self._create_plot(file_path, chunk_info, width, height, channels)
-        self._update_cache(cache_key, result)
-        return result
+        return {
+            'content': content,
+            'media_type': IMAGE_MEDIA_TYPES[image_format],
+            'etag': self.image_etag(cache_key, image_format),
+            'channels_plotted': entry['channels_plotted']
+        }
+    
+    def _encoded(self, cache_key: str, entry: Dict, image_format: str) -> bytes:
+        """Bytes em `image_format` codificados uma vez por render (memória e disco)."""
+        content = entry.get('encoded', {}).get(image_format)
+        if content is not None:
+            return content
+        content = self.disk_cache.get_encoded(cache_key, image_format)
+        if content is None:
+            # WebP lossless: traços finos sem artefatos e ~30% menor que o PNG
+            buffer = BytesIO()
+            Image.open(BytesIO(entry['png'])).save(buffer, format="WEBP", lossless=True)
+            content = buffer.getvalue()
+            self.disk_cache.put_encoded(cache_key, image_format, content)
+        with self._cache_lock:
+            if self.png_cache.get(cache_key) is entry:
+                self._cache_bytes += len(content) - len(entry.get('encoded', {}).get(image_format, b""))
+            entry.setdefault('encoded', {})[image_format] = content
+        return content
+    
+    def chunk_etag(
+        self,
+        file_path: str,
+        chunk_info: ChunkInfo,
+        width: int = 800,
+        height: int = 400,
+        channels: Optional[List[str]] = None,
+        target_samples: Optional[int] = None,
+        renderer: Optional[str] = None,
+        decimation: Optional[str] = None,
+        image_format: str = "png"
+    ) -> str:
+        """ETag forte da imagem sem renderizar (permite responder 304 direto)."""
+        cache_key = self._generate_cache_key(
+            file_path, chunk_info, width, height, channels, target_samples, renderer, decimation
+        )
+        return self.image_etag(cache_key, image_format)
+    
+    def polyline_etag(
+        self,
+        file_path: str,
+        chunk_info: ChunkInfo,
+        width: int = 800,
+        channels: Optional[List[str]] = None,
+        target_samples: Optional[int] = None,
+        decimation: Optional[str] = None
+    ) -> str:
+        # Altura e renderer não afetam as polilinhas
+        cache_key = self._generate_cache_key(
+            file_path, chunk_info, width, 0, channels, target_samples, "polyline", decimation
+        )
+        return f'"{cache_key}.polyline"'
+    
+    @staticmethod
+    def image_etag(cache_key: str, image_format: str) -> str:
+        return f'"{cache_key}.{image_format}"'
+    
+    def _get_or_render(
+        self,
+        file_path: str,
+        chunk_info: ChunkInfo,
+        width: int,
+        height: int,
+        channels: Optional[List[str]],
+        target_samples: Optional[int],
+        renderer: Optional[str],
+        decimation: Optional[str]
+    ):
+        """(cache_key, {'png', 'channels_plotted'}): memória, depois disco, depois render."""
+        renderer = renderer or EEG_PLOT_RENDERER
+        decimation = decimation or PLOT_DECIMATION
+        cache_key = self._generate_cache_key(
+            file_path, chunk_info, width, height, channels, target_samples, renderer, decimation
+        )
+        
+        # A chave inclui o fingerprint do EDF e a geração de invalidação (em
+        # disco, comum a todos os workers): a memória vale sozinha, mesmo com o
+        # disco cheio ou já sem o objeto (o disco é só fallback)
+        cached = self.png_cache.get(cache_key)
+        if cached is not None:
+            self._count('memory_hits')
+            return cache_key, cached
+        
+        # Chamadas idênticas simultâneas esperam o render de quem chegou primeiro
+        with self._inflight_lock:
+            future = self._inflight.get(cache_key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[cache_key] = future
+            else:
+                self._stats['coalesced'] += 1
+        if not leader:
+            return cache_key, future.result()
+        
+        try:
+            entry = self.disk_cache.get(cache_key)
+            if entry is None:
+                # Entre processos (workers do uvicorn, pool do lote) o lock é no disco
+                with self.disk_cache.lock(cache_key):
+                    entry = self.disk_cache.get(cache_key)
+                    if entry is None:
+                        self._count('misses')
+                        entry = self._create_plot(
+                            file_path, chunk_info, width, height, channels, target_samples, renderer, decimation
+                        )
+                        self.disk_cache.put(cache_key, file_path, entry['png'], entry['channels_plotted'])
+                    else:
+                        self._count('coalesced')
+            else:
+                self._count('disk_hits')
+            
+            entry['file_path'] = os.path.abspath(file_path)
+            self._update_cache(cache_key, entry)
+            future.set_result(entry)
+            return cache_key, entry
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(cache_key, None)
+    
+    def _count(self, stat: str):
+        with self._inflight_lock:
+            self._stats[stat] += 1
+    
+    def cache_stats(self) -> Dict:
+        """Contadores deste processo desde o início (cada worker tem os seus)."""
+        with self._inflight_lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._inflight)
+        with self._cache_lock:
+            stats['memory_entries'] = len(self.png_cache)
+            stats['memory_bytes'] = self._cache_bytes
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_ratio'] = (lookups - stats['misses']) / lookups if lookups else None
+        return stats
     
     def _create_plot(
         self, 
@@ -37,86 +327,268 @@ class EEGPlotGenerator:
         chunk_info: ChunkInfo,
         width: int, 
         height: int,
-        channels: Optional[List[str]] = None
+        channels: Optional[List[str]] = None,
+        target_samples: Optional[int] = None,
+        renderer: Optional[str] = None,
+        decimation: Optional[str] = None
     ) -> Dict:
         try:
-            chunk_data = chunk_manager.get_chunk_data(file_path, chunk_info, channels)
+            times, traces, chunk_data = self.decimated_traces(
+                file_path, chunk_info, width, channels, target_samples, decimation
+            )
             
             n_channels = len(chunk_data['channel_names'])
             if n_channels == 0:
                 raise ValueError("Nenhum canal de dados disponível")
-            channel_height = max(1.5, height / 100 / max(1, n_channels / 8))
-            fig_height = channel_height * n_channels
-            
-            fig, axes = plt.subplots(n_channels, 1, figsize=(width/100, fig_height))
-            if n_channels == 1:
-                axes = [axes]
-            
-            for i, channel_name in enumerate(chunk_data['channel_names']):
-                signal = chunk_data['data'][i, :]
-                times = chunk_data['times']
-                
-                axes[i].plot(times, signal, linewidth=0.8, color='blue', alpha=0.8)
-                axes[i].set_ylabel(channel_name, fontsize=9)
-                axes[i].tick_params(axis='both', which='major', labelsize=7)
-                axes[i].grid(True, alpha=0.3)
-                axes[i].set_xlim(chunk_info.start_time, chunk_info.end_time)
-            
-            plt.xlabel('Tempo (segundos)', fontsize=10)
-            
-            channels_info = f"{n_channels} canais" 
-            if channels and len(channels) != len(chunk_data['original_channels']):
-                channels_info = f"{n_channels} de {len(chunk_data['original_channels'])} canais"
             
-            plt.suptitle(
-                f"EEG - Chunk {chunk_info.chunk_index + 1} "
-                f"({chunk_info.start_time:.1f}s - {chunk_info.end_time:.1f}s) - {channels_info}",
-                fontsize=11
+            png_bytes = self._get_renderer(renderer).render(
+                chunk_info, chunk_data, times, traces, width, height, channels
             )
-            plt.tight_layout()
-            
-            # Converte para base64
-            buffer = BytesIO()
-            plt.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
-            plt.close(fig)
-            
-            buffer.seek(0)
-            png_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
             
             return {
-                'png_data': f"data:image/png;base64,{png_base64}",
+                'png': png_bytes,
                 'channels_plotted': chunk_data['channel_names']
             }
             
         except Exception as e:
-            plt.close('all')
             raise RuntimeError(f"Erro ao gerar plot: {str(e)}")
     
-    def _generate_cache_key(self, file_path: str, chunk_index: int, 
-                          width: int, height: int, channels: List[str]) -> str:
+    def decimated_traces(
+        self,
+        file_path: str,
+        chunk_info: ChunkInfo,
+        width: int,
+        channels: Optional[List[str]] = None,
+        target_samples: Optional[int] = None,
+        decimation: Optional[str] = None
+    ):
+        """
+        (times, traces, chunk_data) prontos para desenhar: ~2 pontos por pixel.
+        A pirâmide min/max entrega entre 1x e 2x os buckets pedidos e a
+        decimação corta o excedente; LTTB pede o dobro de buckets para ter
+        onde escolher. `times` é (n,) ou, com LTTB, (n_channels, n).
+        """
+        decimate = self._get_decimator(decimation)
+        n_points = target_samples or 2 * width
+        n_buckets = n_points if decimate is decimate_lttb else max(1, n_points // 2)
+        chunk_data = chunk_manager.get_chunk_envelope(file_path, chunk_info, n_buckets, channels)
+        if chunk_data['level'] > 0:
+            times, traces = interleave(chunk_data['data_min'], chunk_data['data_max'], chunk_data['times'])
+        else:
+            times, traces = chunk_data['times'], chunk_data['data_min']
+        times, traces = decimate(times, traces, n_points)
+        return times, traces, chunk_data
+    
+    @staticmethod
+    def _get_decimator(name: Optional[str]):
+        name = name or PLOT_DECIMATION
+        if name not in DECIMATORS:
+            raise ValueError(f"Decimação inválida: {name}. Opções: {list(DECIMATORS)}")
+        return DECIMATORS[name]
+    
+    @staticmethod
+    def _get_renderer(name: Optional[str]):
+        name = name or EEG_PLOT_RENDERER
+        if name not in renderers:
+            raise ValueError(f"Renderer inválido: {name}. Opções: {list(renderers)}")
+        return renderers[name]
+    
+    # ---------- PREFETCH ----------
+    def prefetch_neighbors(
+        self,
+        file_path: str,
+        chunk_info: ChunkInfo,
+        chunks: List[ChunkInfo],
+        width: int = 800,
+        height: int = 400,
+        channels: Optional[List[str]] = None,
+        target_samples: Optional[int] = None,
+        renderer: Optional[str] = None,
+        decimation: Optional[str] = None
+    ):
+        """
+        Agenda em background o render dos chunks vizinhos (n+1 e, com
+        PLOT_PREFETCH_NEIGHBORS=both, n-1) da mesma visualização. Prefetches
+        pendentes que deixaram de ser vizinhos (o usuário pulou para outro
+        ponto) são cancelados.
+        """
+        if PLOT_PREFETCH_NEIGHBORS == "none" or chunk_info.chunk_index < 0:
+            return
+        
+        offsets = [1, -1] if PLOT_PREFETCH_NEIGHBORS == "both" else [1]
+        neighbors = [
+            chunks[chunk_info.chunk_index + offset]
+            for offset in offsets
+            if 0 <= chunk_info.chunk_index + offset < len(chunks)
+        ]
+        wanted = {
+            self._generate_cache_key(
+                file_path, neighbor, width, height, channels, target_samples, renderer, decimation
+            ): neighbor
+            for neighbor in neighbors
+        }
+        channel_key = "_".join(sorted(channels)) if channels else "all"
+        view_key = (
+            file_path, width, height, channel_key, target_samples,
+            renderer or EEG_PLOT_RENDERER, decimation or PLOT_DECIMATION
+        )
+        
+        with self._prefetch_lock:
+            pending = self._prefetches.pop(view_key, {})
+            for key, future in pending.items():
+                if key not in wanted:
+                    future.cancel()
+            
+            # Descarta visualizações cujos prefetches já terminaram
+            self._prefetches = {
+                view: futures for view, futures in self._prefetches.items()
+                if any(not future.done() for future in futures.values())
+            }
+            in_flight = sum(
+                1 for futures in self._prefetches.values()
+                for future in futures.values() if not future.done()
+            )
+            
+            scheduled = {}
+            for key, neighbor in wanted.items():
+                if key in self.png_cache or self.disk_cache.contains(key):
+                    continue
+                future = pending.get(key)
+                if future is None or future.done():
+                    if in_flight >= PLOT_PREFETCH_MAX_PENDING:
+                        continue
+                    in_flight += 1
+                    future = self._prefetch_executor().submit(
+                        self._prefetch_one, file_path, neighbor, width, height, channels,
+                        target_samples, renderer, decimation
+                    )
+                scheduled[key] = future
+            
+            if scheduled:
+                self._prefetches[view_key] = scheduled
+    
+    def _prefetch_executor(self) -> ThreadPoolExecutor:
+        if self._prefetch_pool is None:
+            self._prefetch_pool = ThreadPoolExecutor(
+                max_workers=PLOT_PREFETCH_WORKERS, thread_name_prefix="plot-prefetch"
+            )
+        return self._prefetch_pool
+    
+    def _prefetch_one(self, file_path: str, chunk_info: ChunkInfo, width: int, height: int,
+                      channels: Optional[List[str]], target_samples: Optional[int], renderer: Optional[str],
+                      decimation: Optional[str]):
+        try:
+            self.generate_chunk_plot(
+                file_path, chunk_info, width, height, channels, target_samples, renderer, decimation
+            )
+        except Exception as e:
+            logger.debug(f"Prefetch do chunk {chunk_info.chunk_index} falhou: {e}")
+    
+    # ---------- OVERVIEW ----------
+    def schedule_overview(self, file_path: str, chunks: List[ChunkInfo], thumbnail: ChunkInfo) -> bool:
+        """
+        Enfileira, em uma thread de baixa prioridade, o render de baixa
+        resolução (PLOT_OVERVIEW_VIEW) de todos os chunks e da gravação
+        inteira direto no cache de plots. Retorna False se o arquivo já tem
+        um overview em andamento.
+        """
+        path = os.path.abspath(file_path)
+        with self._prefetch_lock:
+            pending = self._overviews.get(path)
+            if pending is not None and not pending.done():
+                return False
+            if self._overview_pool is None:
+                self._overview_pool = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="plot-overview", initializer=_lower_thread_priority
+                )
+            self._overviews[path] = self._overview_pool.submit(
+                self._render_overview, file_path, [thumbnail] + list(chunks)
+            )
+            return True
+    
+    def overview_image(self, file_path: str, chunk_info: ChunkInfo, image_format: str = "png") -> Dict:
+        return self.generate_chunk_image(file_path, chunk_info, **PLOT_OVERVIEW_VIEW, image_format=image_format)
+    
+    def schedule_file_overview(self, file_path: str) -> bool:
+        """schedule_overview com os chunks e a gravação inteira lidos do cabeçalho."""
+        edf_info = chunk_manager.read_edf_info(file_path)
+        return self.schedule_overview(
+            file_path, chunk_manager.calculate_chunks(edf_info['duration']), chunk_manager.full_range(edf_info)
+        )
+    
+    def _render_overview(self, file_path: str, chunk_infos: List[ChunkInfo]):
+        # Agendado depois da validação, com o sample store já gerado: cada
+        # overview custa poucos ms. Nunca gera o store aqui (arquivo pode ser inválido)
+        rendered = 0
+        for chunk_info in chunk_infos:
+            try:
+                self._get_or_render(file_path, chunk_info, **PLOT_OVERVIEW_VIEW)
+                rendered += 1
+            except Exception as e:
+                logger.warning(f"Overview de {file_path} ({chunk_info.start_time:.0f}s) falhou: {e}")
+        logger.info(f"Overview de {file_path}: {rendered}/{len(chunk_infos)} plots no cache")
+        
+        with self._prefetch_lock:
+            self._overviews.pop(os.path.abspath(file_path), None)
+    
+    def shutdown(self):
+        if self._prefetch_pool is not None:
+            self._prefetch_pool.shutdown(wait=False, cancel_futures=True)
+            self._prefetch_pool = None
+        if self._overview_pool is not None:
+            self._overview_pool.shutdown(wait=False, cancel_futures=True)
+            self._overview_pool = None
+    
+    def _generate_cache_key(self, file_path: str, chunk_info: ChunkInfo, width: int, height: int,
+                          channels: List[str], target_samples: Optional[int] = None,
+                          renderer: Optional[str] = None, decimation: Optional[str] = None) -> str:
         import hashlib
         channel_key = "_".join(sorted(channels)) if channels else "all"
-        key_string = f"{file_path}_{chunk_index}_{width}_{height}_{channel_key}"
-        return hashlib.md5(key_string.encode()).hexdigest()
+        range_key = f"{chunk_info.chunk_index}_{chunk_info.start_time}_{chunk_info.end_time}"
+        view_key = f"{renderer or EEG_PLOT_RENDERER}_{decimation or PLOT_DECIMATION}"
+        # Fingerprint (path, size, mtime): um EDF reescrito nunca reaproveita renders antigos
+        path, size, mtime_ns = file_fingerprint(file_path)
+        # Geração: DELETE /plots/cache em qualquer worker troca as chaves de todos
+        file_key = f"{path}_{size}_{mtime_ns}_{self.disk_cache.generation(file_path)}"
+        key_string = f"{file_key}_{range_key}_{width}_{height}_{channel_key}_{target_samples}_{view_key}"
+        return hashlib.sha256(key_string.encode()).hexdigest()
+    
+    @staticmethod
+    def _entry_bytes(entry: Dict) -> int:
+        return len(entry['png']) + sum(len(content) for content in entry.get('encoded', {}).values())
     
     def _update_cache(self, key: str, value: Dict):
-        if key in self.png_cache:
-            self.png_cache.pop(key)
-        elif len(self.png_cache) >= self.max_cache_size:
-            self.png_cache.popitem(last=False)
-        self.png_cache[key] = value
-    
-    def clear_cache(self, file_path: str = None):
-        if file_path:
-            import hashlib
-            keys_to_remove = []
-            target_prefix = hashlib.md5(file_path.encode()).hexdigest()[:10]
-            for key in list(self.png_cache.keys()):
-                if key.startswith(target_prefix):
-                    keys_to_remove.append(key)
+        with self._cache_lock:
+            previous = self.png_cache.pop(key, None)
+            if previous is not None:
+                self._cache_bytes -= self._entry_bytes(previous)
+            self.png_cache[key] = value
+            self._cache_bytes += self._entry_bytes(value)
+            while self.png_cache and (
+                len(self.png_cache) > self.max_cache_size or self._cache_bytes > self.max_cache_bytes
+            ):
+                _, evicted = self.png_cache.popitem(last=False)
+                self._cache_bytes -= self._entry_bytes(evicted)
+    
+    def clear_cache(self, file_path: str = None) -> int:
+        """Invalida os plots de um EDF (memória e disco) ou o cache inteiro."""
+        with self._cache_lock:
+            if file_path:
+                path = os.path.abspath(file_path)
+                keys_to_remove = [key for key, entry in self.png_cache.items() if entry['file_path'] == path]
+            else:
+                keys_to_remove = list(self.png_cache.keys())
             for key in keys_to_remove:
-                self.png_cache.pop(key, None)
-        else:
-            self.png_cache.clear()
+                self._cache_bytes -= self._entry_bytes(self.png_cache.pop(key))
+        return self.disk_cache.invalidate(file_path)
 
 plot_generator = EEGPlotGenerator()
+
+
+def render_chunk_plot(*args, **kwargs) -> Dict:
+    """
+    Ponto de entrada dos renders em processos separados (pool do
+    eeg_executor): usa o plot_generator do próprio processo, que compartilha
+    o cache em disco com os demais.
+    """
+    return plot_generator.generate_chunk_plot(*args, **kwargs)
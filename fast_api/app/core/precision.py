@@ -0,0 +1,31 @@
+import os
+import mne
+import numpy as np
+
+# Precisão dos sinais em memória. float32 reduz pela metade a RAM por gravação
+# e a banda de memória; amplitudes de EEG (µV, ADC de 16/24 bits) cabem com folga
+EEG_FLOAT_DTYPES = ("float32", "float64")
+EEG_DTYPE = os.getenv("EEG_DTYPE", "float64")
+
+
+def resolve_dtype(dtype=None) -> np.dtype:
+    """dtype explícito ou EEG_DTYPE; só float32/float64 são aceitos."""
+    name = np.dtype(dtype if dtype is not None else EEG_DTYPE).name
+    if name not in EEG_FLOAT_DTYPES:
+        raise ValueError(f"dtype inválido: {name}. Opções: {list(EEG_FLOAT_DTYPES)}")
+    return np.dtype(name)
+
+
+def load_data_as(raw: mne.io.BaseRaw, dtype) -> mne.io.BaseRaw:
+    """
+    Carrega as amostras pela API pública do MNE (sempre em float64) e converte
+    para `dtype`. Em float32 o pico é float64 + float32 durante a conversão; a
+    matriz float64 é liberada logo em seguida.
+    """
+    dtype = resolve_dtype(dtype)
+    with mne.utils.use_log_level("ERROR"):
+        raw.load_data()
+        if dtype != np.float64:
+            # Função identidade por canal: só a conversão de dtype tem efeito
+            raw.apply_function(lambda x: x, picks="all", dtype=dtype)
+    return raw
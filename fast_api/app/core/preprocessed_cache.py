@@ -0,0 +1,177 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import mne
+import numpy as np
+
+from .precision import load_data_as
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_CONTAINER_PATH = Path(os.getenv("OUTPUT_CONTAINER_PATH", "/tmp/output"))
+PREPROCESSED_CACHE_PATH = Path(
+    os.getenv("PREPROCESSED_CACHE_PATH", str(OUTPUT_CONTAINER_PATH / "preprocessed"))
+)
+# 0 desativa o cache. Uma gravação de várias horas em float64 passa de
+# 5 GB; entradas maiores que o limite não são gravadas
+PREPROCESSED_CACHE_MAX_BYTES = int(os.getenv("PREPROCESSED_CACHE_MAX_BYTES", str(16 * 1024 ** 3)))
+# Incrementar quando o pipeline de validate_and_preprocess mudar
+PREPROCESSED_CACHE_VERSION = "1"
+
+EDF_HEADER_BYTES = 256
+
+
+def content_fingerprint(file_path: str) -> Tuple[int, int, str]:
+    """
+    (size, mtime, hash do cabeçalho completo). Não depende do caminho:
+    arquivos renomeados ou movidos (o mtime é preservado) reaproveitam o mesmo
+    pré-processamento; cópias só quando preservam o mtime (cp -p, rsync -t).
+    """
+    stat = os.stat(file_path)
+    with open(file_path, "rb") as handle:
+        fixed = handle.read(EDF_HEADER_BYTES)
+        try:
+            n_signals = int(fixed[252:256].decode("ascii").strip())
+        except ValueError:
+            n_signals = 0
+        header = fixed + handle.read(EDF_HEADER_BYTES * max(n_signals, 0))
+    return stat.st_size, stat.st_mtime_ns, hashlib.sha1(header).hexdigest()
+
+
+class PreprocessedCache:
+    """
+    Saída de validate_and_preprocess (validada, normalizada, com montagem)
+    salva em disco como <key>_raw.fif + <key>.json (estatísticas e relatório de
+    qualidade). Acima de 2 GB o MNE divide o FIF em partes <key>_raw-N.fif,
+    tratadas sempre em conjunto. A chave combina o fingerprint do conteúdo com
+    os canais, o método de normalização e o dtype. Escrita atômica (json por
+    último marca a entrada como completa); o mtime do .fif marca o último
+    acesso e a remoção segue LRU até caber em PREPROCESSED_CACHE_MAX_BYTES.
+    """
+
+    def __init__(self, root: Path = PREPROCESSED_CACHE_PATH, max_bytes: int = PREPROCESSED_CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(file_path: str, channels: Optional[List[str]], normalization: str, dtype) -> str:
+        size, mtime_ns, header_hash = content_fingerprint(file_path)
+        channel_key = ",".join(sorted(channels)) if channels else "*"
+        key_string = (
+            f"v{PREPROCESSED_CACHE_VERSION}_{size}_{mtime_ns}_{header_hash}_"
+            f"{channel_key}_{normalization}_{np.dtype(dtype).name}"
+        )
+        return hashlib.sha256(key_string.encode()).hexdigest()
+
+    def _paths(self, key: str) -> Tuple[Path, Path]:
+        entry_dir = self.root / key[:2]
+        return entry_dir / f"{key}_raw.fif", entry_dir / f"{key}.json"
+
+    # ---------- LEITURA / ESCRITA ----------
+    def get(self, key: str) -> Optional[Tuple[mne.io.BaseRaw, Dict]]:
+        if not self.enabled:
+            return None
+        fif_path, meta_path = self._paths(key)
+        try:
+            stats = json.loads(meta_path.read_text())
+            raw = mne.io.read_raw_fif(fif_path, preload=False, verbose="ERROR")
+            load_data_as(raw, stats["dtype"])
+        except (OSError, ValueError) as e:
+            if meta_path.exists():
+                logger.warning(f"Entrada inválida no cache de pré-processamento {key}: {e}")
+            return None
+        try:
+            os.utime(fif_path)
+        except OSError:
+            pass
+
+        stats["center"] = np.asarray(stats["center"])
+        stats["scale"] = np.asarray(stats["scale"])
+        return raw, stats
+
+    @staticmethod
+    def _parts(entry_dir: Path, key: str) -> List[Path]:
+        """<key>_raw.fif e as partes extras <key>_raw-N.fif do split do MNE."""
+        return [entry_dir / f"{key}_raw.fif", *entry_dir.glob(f"{key}_raw-*.fif")]
+
+    def put(self, key: str, raw: mne.io.BaseRaw, stats: Dict):
+        if not self.enabled:
+            return
+        # double preserva os dados float64 exatamente; single para float32
+        single = stats["dtype"] == "float32"
+        fmt = "single" if single else "double"
+        size = raw.info["nchan"] * raw.n_times * (4 if single else 8)
+        if size > self.max_bytes:
+            # Seria removida logo após a escrita: não paga o custo de gravar
+            logger.info(
+                f"Pré-processamento de {size / 1024 ** 3:.1f} GB excede o cache "
+                f"({self.max_bytes / 1024 ** 3:.1f} GB): não armazenado"
+            )
+            return
+
+        fif_path, meta_path = self._paths(key)
+        entry_dir = fif_path.parent
+        # Diretório temporário com os nomes finais: as partes do split
+        # referenciam umas às outras pelo nome do arquivo
+        tmp_dir = entry_dir / f".{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+        meta = {**stats, "center": stats["center"].tolist(), "scale": stats["scale"].tolist()}
+        try:
+            tmp_dir.mkdir(parents=True, exist_ok=True)
+            raw.save(tmp_dir / fif_path.name, fmt=fmt, overwrite=True, verbose="ERROR")
+            (tmp_dir / meta_path.name).write_text(json.dumps(meta))
+            # Partes extras primeiro, depois o .fif principal e o json por último
+            parts = sorted(tmp_dir.glob(f"{key}_raw-*.fif"))
+            for part in [*parts, tmp_dir / fif_path.name, tmp_dir / meta_path.name]:
+                os.replace(part, entry_dir / part.name)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Falha ao gravar pré-processamento no cache: {e}")
+            return
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        self._evict()
+
+    def _evict(self):
+        """Remove as entradas menos usadas até caber no limite (desce até 90%)."""
+        with self._lock:
+            entries = {}
+            total = 0
+            for part in self.root.glob("*/*_raw*.fif"):
+                try:
+                    stat = part.stat()
+                except OSError:
+                    continue
+                key = part.name.split("_raw", 1)[0]
+                mtime_ns, size, entry_dir = entries.get(key, (0, 0, part.parent))
+                if part.name == f"{key}_raw.fif":
+                    mtime_ns = stat.st_mtime_ns
+                entries[key] = (mtime_ns, size + stat.st_size, entry_dir)
+                total += stat.st_size
+            if total <= self.max_bytes:
+                return
+
+            target = int(self.max_bytes * 0.9)
+            removed = 0
+            for mtime_ns, size, key, entry_dir in sorted((m, s, k, d) for k, (m, s, d) in entries.items()):
+                if total <= target:
+                    break
+                (entry_dir / f"{key}.json").unlink(missing_ok=True)
+                for part in self._parts(entry_dir, key):
+                    part.unlink(missing_ok=True)
+                total -= size
+                removed += 1
+            logger.info(f"Cache de pré-processamento: {removed} entradas removidas (LRU)")
+
+
+preprocessed_cache = PreprocessedCache()
@@ -1,38 +1,322 @@
 import logging
+import os
 from pathlib import Path
+from typing import Dict, List, Optional
 import numpy as np
 import mne
 
+from .precision import load_data_as, resolve_dtype
+from .preprocessed_cache import preprocessed_cache
+
 logger = logging.getLogger(__name__)
 
+NORMALIZATION_METHODS = ("zscore", "robust")
+EEG_NORMALIZATION = os.getenv("EEG_NORMALIZATION", "zscore")
+
+# Validação dos dados em blocos de N s (memória limitada, uma passada)
+EDF_VALIDATION_BLOCK_SECONDS = float(os.getenv("EDF_VALIDATION_BLOCK_SECONDS", "10"))
+# Trecho com o mesmo valor repetido por pelo menos N s é linha reta
+EDF_FLAT_LINE_SECONDS = float(os.getenv("EDF_FLAT_LINE_SECONDS", "1"))
+# Fração de amostras repetidas no valor extremo do canal que indica saturação
+EDF_CLIPPING_FRACTION = float(os.getenv("EDF_CLIPPING_FRACTION", "0.001"))
+MAX_REPORTED_SPANS = 10
+
 
 class EDFValidationError(Exception):
-    pass
+    def __init__(self, message: str, issues: Optional[List[Dict]] = None):
+        super().__init__(message)
+        self.issues = issues or []
 
 def _check_channels(raw: mne.io.BaseRaw):
     if raw.info["nchan"] == 0:
         raise EDFValidationError("Arquivo EDF sem canais detectados.")
 
 
-def _check_data(raw: mne.io.BaseRaw):
-    data, _ = raw[:]
-    if not np.isfinite(data).all():
-        raise EDFValidationError("Arquivo EDF contém valores inválidos (NaN/inf).")
+class _DataScan:
+    """
+    Acumuladores por canal para a validação em uma passada: contagem e
+    trechos de NaN/inf, média/variância (Welford, blocos combinados pela
+    fórmula de Chan), trechos de linha reta e repetições no valor extremo
+    (saturação). Cada bloco é (n_canais, n_amostras) a partir de `start`.
+    """
+
+    def __init__(self, n_channels: int, min_flat: int):
+        self.min_flat = min_flat
+        self.count = np.zeros(n_channels)
+        self.mean = np.zeros(n_channels)
+        self.m2 = np.zeros(n_channels)
+        self.nonfinite = np.zeros(n_channels, dtype=np.int64)
+        self.nonfinite_spans = [[] for _ in range(n_channels)]
+        self.flat_spans = [[] for _ in range(n_channels)]
+        self.run_start = np.zeros(n_channels, dtype=np.int64)
+        self.last = np.full(n_channels, np.nan)
+        self.extremes = {
+            "max": [np.full(n_channels, -np.inf), np.zeros(n_channels, dtype=np.int64)],
+            "min": [np.full(n_channels, np.inf), np.zeros(n_channels, dtype=np.int64)],
+        }
+        self.n_times = 0
+
+    @staticmethod
+    def _add_span(spans: List, first: int, stop: int):
+        if spans and spans[-1][1] == first:
+            spans[-1][1] = stop
+        else:
+            spans.append([first, stop])
+
+    def update(self, block: np.ndarray, start: int):
+        n_samples = block.shape[1]
+        finite = np.isfinite(block)
+        all_finite = finite.all()
+        values = block if all_finite else np.where(finite, block, np.nan)
+
+        # NaN/inf: contagem e trechos contíguos
+        if not all_finite:
+            for ch in np.flatnonzero(~finite.all(axis=1)):
+                bad = np.flatnonzero(~finite[ch]) + start
+                self.nonfinite[ch] += len(bad)
+                breaks = np.flatnonzero(np.diff(bad) > 1)
+                for first, last in zip(np.r_[bad[0], bad[breaks + 1]], np.r_[bad[breaks], bad[-1]]):
+                    self._add_span(self.nonfinite_spans[ch], int(first), int(last) + 1)
+
+        # Média/variância: estatísticas do bloco combinadas com as acumuladas
+        n_block = finite.sum(axis=1) if not all_finite else np.full(len(block), n_samples)
+        with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+            # Acumula em float64 também quando os dados são float32
+            if all_finite:
+                block_sum = values.sum(axis=1, dtype=np.float64)
+            else:
+                block_sum = np.nansum(values, axis=1, dtype=np.float64)
+            block_mean = block_sum / n_block
+            centered = values - block_mean[:, None]
+            block_m2 = np.nansum(centered * centered, axis=1)
+            total = self.count + n_block
+            delta = block_mean - self.mean
+            has_data = n_block > 0
+            self.mean = np.where(has_data, self.mean + delta * n_block / total, self.mean)
+            self.m2 = np.where(
+                has_data, self.m2 + block_m2 + delta * delta * self.count * n_block / total, self.m2
+            )
+        self.count = total
+
+        # Linha reta: runs de valores iguais, continuando do bloco anterior
+        extended = np.concatenate([self.last[:, None], values], axis=1)
+        same = extended[:, 1:] == extended[:, :-1]
+        for ch in range(len(block)):
+            bounds = np.r_[self.run_start[ch], np.flatnonzero(~same[ch]) + start]
+            long_runs = np.flatnonzero(np.diff(bounds) >= self.min_flat)
+            for i in long_runs:
+                self._add_span(self.flat_spans[ch], int(bounds[i]), int(bounds[i + 1]))
+            self.run_start[ch] = bounds[-1]
+
+        # Saturação: amostras repetidas (x[i] == x[i-1]) no máximo/mínimo do canal
+        with np.errstate(invalid="ignore"):
+            for name, reducer, better in (("max", np.nanmax, np.greater), ("min", np.nanmin, np.less)):
+                value, repeats = self.extremes[name]
+                if not has_data.any():
+                    break
+                block_value = np.full(len(block), np.nan)
+                block_value[has_data] = reducer(values[has_data], axis=1)
+                stuck = (same & (values == block_value[:, None])).sum(axis=1)
+                replace = better(block_value, value)
+                equal = block_value == value
+                repeats[:] = np.where(replace, stuck, np.where(equal, repeats + stuck, repeats))
+                value[:] = np.where(replace, block_value, value)
+
+        self.last = values[:, -1].copy()
+        self.n_times = start + n_samples
+
+    def finish(self):
+        for ch in np.flatnonzero(self.n_times - self.run_start >= self.min_flat):
+            self._add_span(self.flat_spans[ch], int(self.run_start[ch]), self.n_times)
+
+    def std(self) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.sqrt(self.m2 / self.count)
+
+    def clipped_fraction(self) -> np.ndarray:
+        repeats = np.maximum(self.extremes["max"][1], self.extremes["min"][1])
+        return repeats / max(self.n_times, 1)
+
+
+def _format_spans(spans: List, sfreq: float) -> List[List[float]]:
+    return [[round(first / sfreq, 3), round(stop / sfreq, 3)] for first, stop in spans[:MAX_REPORTED_SPANS]]
+
+
+def _check_data(raw: mne.io.BaseRaw) -> Dict:
+    """
+    Validação em uma passada por blocos de EDF_VALIDATION_BLOCK_SECONDS, sem
+    copiar a gravação inteira. NaN/inf e canais constantes são erros
+    (EDFValidationError com `issues`); trechos em linha reta e saturação
+    entram no relatório como avisos. Retorna o relatório com média/desvio
+    por canal.
+    """
+    sfreq = raw.info["sfreq"]
+    n_times = raw.n_times
+    block = max(1, int(sfreq * EDF_VALIDATION_BLOCK_SECONDS))
+    scan = _DataScan(raw.info["nchan"], max(2, int(sfreq * EDF_FLAT_LINE_SECONDS)))
+
+    for start in range(0, n_times, block):
+        stop = min(start + block, n_times)
+        # Pré-carregado: fatia (view) da matriz; senão lê só o bloco
+        data = raw._data[:, start:stop] if raw.preload else raw.get_data(start=start, stop=stop)
+        scan.update(data, start)
+    scan.finish()
+
+    std = scan.std()
+    clipped = scan.clipped_fraction()
+    issues = []
+    for ch, name in enumerate(raw.ch_names):
+        if scan.nonfinite[ch]:
+            issues.append({
+                "channel": name, "issue": "nonfinite", "severity": "error",
+                "samples": int(scan.nonfinite[ch]),
+                "spans": _format_spans(scan.nonfinite_spans[ch], sfreq),
+            })
+        whole_flat = scan.flat_spans[ch] == [[0, n_times]]
+        if scan.count[ch] and (whole_flat or not std[ch] > 0):
+            issues.append({"channel": name, "issue": "zero_variance", "severity": "error", "spans": []})
+        elif scan.flat_spans[ch]:
+            issues.append({
+                "channel": name, "issue": "flat_line", "severity": "warning",
+                "spans": _format_spans(scan.flat_spans[ch], sfreq),
+            })
+        if clipped[ch] >= EDF_CLIPPING_FRACTION:
+            issues.append({
+                "channel": name, "issue": "clipping", "severity": "warning",
+                "fraction": round(float(clipped[ch]), 6), "spans": [],
+            })
+
+    errors = [issue for issue in issues if issue["severity"] == "error"]
+    if errors:
+        labels = {"nonfinite": "valores inválidos (NaN/inf)", "zero_variance": "variância zero"}
+        details = "; ".join(
+            f"{issue['channel']}: {labels[issue['issue']]}"
+            + (f" em {', '.join(f'{a}-{b}s' for a, b in issue['spans'])}" if issue["spans"] else "")
+            for issue in errors
+        )
+        raise EDFValidationError(f"Arquivo EDF com dados inválidos: {details}", issues=errors)
+
+    for issue in issues:
+        logger.warning(f"Aviso de qualidade no canal {issue['channel']}: {issue['issue']}")
+
+    return {
+        "issues": issues,
+        "mean": dict(zip(raw.ch_names, scan.mean.tolist())),
+        "std": dict(zip(raw.ch_names, std.tolist())),
+    }
+
+
+def _normalize(raw: mne.io.BaseRaw, method: str = "zscore", dtype=np.float64) -> Dict:
+    """
+    Normaliza a matriz (n_canais, n_amostras) inteira in place, sem closure
+    por canal. zscore: (x - média) / desvio; robust: (x - mediana) / IQR.
+    Canais com escala zero ficam inalterados. Retorna as estatísticas por
+    canal (center, scale) para reaproveitamento.
+    """
+    if method not in NORMALIZATION_METHODS:
+        raise ValueError(f"Normalização inválida: {method}. Opções: {list(NORMALIZATION_METHODS)}")
 
-    if np.any(data.std(axis=1) == 0):
-        raise EDFValidationError("Canal com variância zero encontrado.")
+    # raw._data direto: apply_function copia a matriz (data[picks, :])
+    if raw._data.dtype != dtype:
+        raw._data = raw._data.astype(dtype)
+    data = raw._data
 
+    if method == "zscore":
+        # Acumula em float64 mesmo com dados float32
+        center = data.mean(axis=1, dtype=np.float64)
+        data -= center.astype(data.dtype)[:, None]
+        # Desvio sobre os dados já centralizados: sem array temporário (x - média)
+        scale = np.sqrt(np.einsum("ij,ij->i", data, data, dtype=np.float64) / data.shape[1])
+    else:
+        # Percentis exigem uma cópia particionada; uma só chamada para os três
+        q25, center, q75 = np.percentile(data, [25, 50, 75], axis=1).astype(np.float64)
+        data -= center.astype(data.dtype)[:, None]
+        scale = q75 - q25
 
-def _normalize(raw: mne.io.BaseRaw) -> mne.io.BaseRaw:
-    def zscore(channel_data):
-        mean = channel_data.mean()
-        std = channel_data.std()
-        return (channel_data - mean) / std if std > 0 else channel_data
+    flat = scale == 0
+    if flat.any():
+        data[flat] += center[flat, None].astype(data.dtype)
+        center[flat] = 0.0
+        scale[flat] = 1.0
+    data *= (1.0 / scale).astype(data.dtype)[:, None]
 
-    raw.apply_function(zscore, picks="all", dtype=np.float64)
+    return {
+        "method": method,
+        "dtype": np.dtype(dtype).name,
+        "channel_names": list(raw.ch_names),
+        "center": center,
+        "scale": scale,
+    }
+
+
+def _check_size(file: Path):
+    # O MNE recalcula n_records pelo tamanho do arquivo quando ele está
+    # truncado; compara o número declarado no cabeçalho (bytes 236-244) com
+    # quantos registros completos cabem nos bytes presentes
+    with open(file, "rb") as handle:
+        fixed = handle.read(256)
+        try:
+            n_signals = int(fixed[252:256].decode("ascii").strip())
+            header_bytes = int(fixed[184:192].decode("ascii").strip())
+        except ValueError:
+            raise EDFValidationError("Cabeçalho EDF com tamanho ou número de sinais inválido.")
+        # Amostras por registro: 8 bytes por sinal após os 216 bytes de campos anteriores
+        handle.seek(256 + 216 * n_signals)
+        samples_field = handle.read(8 * n_signals).decode("ascii", errors="ignore")
+    field = fixed[236:244].decode("ascii", errors="ignore").strip()
+    try:
+        declared = int(field)
+    except ValueError:
+        raise EDFValidationError(f"Cabeçalho EDF com número de registros inválido: {field!r}")
+    try:
+        samples_per_record = sum(int(samples_field[i:i + 8]) for i in range(0, 8 * n_signals, 8))
+    except ValueError:
+        raise EDFValidationError("Cabeçalho EDF com amostras por registro inválidas.")
+
+    # BDF (0xFF no primeiro byte) usa 24 bits por amostra
+    bytes_per_sample = 3 if fixed[:1] == b"\xff" else 2
+    record_bytes = samples_per_record * bytes_per_sample
+    if record_bytes <= 0:
+        raise EDFValidationError("Cabeçalho EDF sem amostras por registro.")
+    available = max(0, file.stat().st_size - header_bytes) // record_bytes
+    if declared != -1 and available < declared:
+        raise EDFValidationError(
+            f"Arquivo EDF truncado: {available} de {declared} registros de dados presentes."
+        )
+
+
+def validate_header(file_path: str) -> mne.io.BaseRaw:
+    """
+    Validação rápida para o cadastro: lê só o cabeçalho (preload=False) e
+    confere canais, frequência, duração e o tamanho do arquivo. O custo não
+    depende da duração da gravação. Retorna o raw sem amostras carregadas.
+    """
+    file = Path(file_path)
+    if not file.exists():
+        raise EDFValidationError(f"Arquivo EDF não encontrado: {file_path}")
+
+    try:
+        raw = mne.io.read_raw_edf(file_path, preload=False, verbose="ERROR")
+    except Exception as e:
+        raise EDFValidationError(f"Erro ao ler cabeçalho EDF: {e}")
+
+    _check_channels(raw)
+    if raw.info["sfreq"] <= 0 or raw.n_times == 0:
+        raise EDFValidationError("Cabeçalho EDF sem amostras ou com frequência inválida.")
+    _check_size(file)
     return raw
 
 
+def validate_data(file_path: str) -> Dict:
+    """
+    Validação profunda (em background, após o cadastro): cabeçalho e depois
+    as amostras em blocos, sem pré-carregar a gravação. Retorna o relatório
+    de qualidade de _check_data.
+    """
+    raw = validate_header(file_path)
+    return _check_data(raw)
+
+
 def _set_standard_montage(raw: mne.io.BaseRaw):
     try:
         raw.set_montage("standard_1020", on_missing="ignore")
@@ -40,22 +324,56 @@ def _set_standard_montage(raw: mne.io.BaseRaw):
         logger.warning(f"Não foi possível aplicar montagem padrão: {e}")
 
 
-def validate_and_preprocess(file_path: str) -> mne.io.BaseRaw:
+def validate_and_preprocess(
+    file_path: str,
+    channels: Optional[List[str]] = None,
+    normalization: str = EEG_NORMALIZATION,
+    dtype=None,
+    return_stats: bool = False,
+    use_cache: bool = True
+):
+    """
+    Carrega, valida e normaliza um EDF. Com return_stats=True retorna
+    (raw, estatísticas da normalização + relatório de qualidade em "quality").
+    O resultado fica no cache de pré-processamento em disco; chamadas
+    seguintes com o arquivo inalterado não decodificam nem normalizam de novo.
+    dtype: float32 ou float64 (padrão: EEG_DTYPE).
+    """
+    dtype = resolve_dtype(dtype)
     file = Path(file_path)
     if not file.exists():
         raise EDFValidationError(f"Arquivo EDF não encontrado: {file_path}")
 
+    if normalization not in NORMALIZATION_METHODS:
+        raise ValueError(f"Normalização inválida: {normalization}. Opções: {list(NORMALIZATION_METHODS)}")
+
+    cache_key = preprocessed_cache.key(file_path, channels, normalization, dtype) if use_cache else None
+    cached = preprocessed_cache.get(cache_key) if cache_key else None
+    if cached is not None:
+        raw, stats = cached
+        logger.info(f"Pré-processamento reaproveitado do cache: {file.name}")
+        return (raw, stats) if return_stats else raw
+
     try:
-        raw = mne.io.read_raw_edf(file_path, preload=True, verbose="ERROR")
+        # include: canais fora da seleção nunca são decodificados nem alocados
+        raw = mne.io.read_raw_edf(file_path, include=channels or None, preload=False, verbose="ERROR")
+    except Exception as e:
+        raise EDFValidationError(f"Erro ao carregar EDF: {e}")
+
+    if channels and raw.info["nchan"] == 0:
+        raise EDFValidationError(f"Nenhum dos canais solicitados existe no EDF: {channels}")
+
+    try:
+        load_data_as(raw, dtype)
     except Exception as e:
         raise EDFValidationError(f"Erro ao carregar EDF: {e}")
 
     # --- Validações ---
     _check_channels(raw)
-    _check_data(raw)
+    quality = _check_data(raw)
 
     # --- Normalização ---
-    raw = _normalize(raw)
+    stats = _normalize(raw, method=normalization, dtype=dtype)
 
     # --- Padronização ---
     _set_standard_montage(raw)
@@ -67,5 +385,11 @@ def validate_and_preprocess(file_path: str) -> mne.io.BaseRaw:
 
     logger.info(f"Pré-processamento concluído: {file.name}")
 
+    stats = {**stats, "quality": quality}
+    if cache_key:
+        preprocessed_cache.put(cache_key, raw, stats)
+
+    if return_stats:
+        return raw, stats
     return raw
 
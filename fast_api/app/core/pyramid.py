@@ -0,0 +1,99 @@
+import math
+import os
+from typing import List
+
+import numpy as np
+
+# Não gera níveis com menos buckets que isso (um chunk inteiro já cabe em poucos pixels)
+PYRAMID_MIN_BUCKETS = int(os.getenv("PYRAMID_MIN_BUCKETS", "512"))
+
+
+def reduce_envelope(data_min: np.ndarray, data_max: np.ndarray):
+    """
+    Reduz um nível da pirâmide para o seguinte (buckets 2x maiores).
+    Aceita (n_samples,) ou (n_channels, n_samples); com número ímpar de
+    amostras o último bucket fica com uma única amostra.
+    """
+    if data_min.shape[-1] % 2:
+        data_min = np.concatenate([data_min, data_min[..., -1:]], axis=-1)
+        data_max = np.concatenate([data_max, data_max[..., -1:]], axis=-1)
+    new_shape = data_min.shape[:-1] + (-1, 2)
+    return (
+        data_min.reshape(new_shape).min(axis=-1),
+        data_max.reshape(new_shape).max(axis=-1),
+    )
+
+
+def group_envelope(data_min: np.ndarray, data_max: np.ndarray, factor: int):
+    """
+    Junta cada `factor` buckets consecutivos em um (o último pode ficar
+    parcial). Generaliza reduce_envelope para fatores que não são 2.
+    """
+    if factor <= 1:
+        return data_min, data_max
+    pad = -data_min.shape[-1] % factor
+    if pad:
+        widths = [(0, 0)] * (data_min.ndim - 1) + [(0, pad)]
+        data_min = np.pad(data_min, widths, mode="edge")
+        data_max = np.pad(data_max, widths, mode="edge")
+    new_shape = data_min.shape[:-1] + (-1, factor)
+    return (
+        data_min.reshape(new_shape).min(axis=-1),
+        data_max.reshape(new_shape).max(axis=-1),
+    )
+
+
+def envelope(data: np.ndarray, level: int):
+    """Envelope (min, max) de `data` em buckets de 2**level amostras."""
+    data_min, data_max = data, data
+    for _ in range(level):
+        data_min, data_max = reduce_envelope(data_min, data_max)
+    return data_min, data_max
+
+
+def count_levels(n_times: int) -> int:
+    levels = 0
+    n_buckets = n_times
+    while math.ceil(n_buckets / 2) >= PYRAMID_MIN_BUCKETS:
+        n_buckets = math.ceil(n_buckets / 2)
+        levels += 1
+    return levels
+
+
+def level_shapes(n_channels: int, n_times: int, n_levels: int) -> List[tuple]:
+    shapes = []
+    n_buckets = n_times
+    for _ in range(n_levels):
+        n_buckets = math.ceil(n_buckets / 2)
+        shapes.append((n_channels, n_buckets, 2))
+    return shapes
+
+
+def build_levels(samples: np.ndarray, levels: List[np.ndarray]):
+    """
+    Preenche os níveis 1..len(levels) da pirâmide, arrays (n_channels, n_buckets, 2)
+    com (min, max) criados a partir de `level_shapes`. Processa um canal por
+    vez para limitar a memória quando `samples` e `levels` são memmaps.
+    """
+    for ch in range(samples.shape[0]):
+        data_min = data_max = np.asarray(samples[ch])
+        for level in levels:
+            data_min, data_max = reduce_envelope(data_min, data_max)
+            level[ch, :, 0] = data_min
+            level[ch, :, 1] = data_max
+
+
+def select_level(n_samples: int, n_pixels: int, max_level: int) -> int:
+    """Nível mais grosso que ainda garante pelo menos um bucket por pixel."""
+    if n_pixels <= 0 or n_samples <= n_pixels:
+        return 0
+    return max(0, min(int(math.floor(math.log2(n_samples / n_pixels))), max_level))
+
+
+def interleave(data_min: np.ndarray, data_max: np.ndarray, times: np.ndarray):
+    """
+    Converte o envelope em uma polilinha (min, max, min, max, ...) com os
+    tempos repetidos, que desenhada como linha reproduz o traçado original.
+    """
+    values = np.stack([data_min, data_max], axis=-1).reshape(data_min.shape[:-1] + (-1,))
+    return np.repeat(times, 2), values
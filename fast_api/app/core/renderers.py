@@ -0,0 +1,282 @@
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Dict, List, Optional
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from .chunks import ChunkInfo
+
+
+def plot_title(chunk_info: ChunkInfo, chunk_data: Dict, channels: Optional[List[str]]) -> str:
+    n_channels = len(chunk_data['channel_names'])
+    channels_info = f"{n_channels} canais"
+    if channels and len(channels) != len(chunk_data['original_channels']):
+        channels_info = f"{n_channels} de {len(chunk_data['original_channels'])} canais"
+
+    chunk_label = f"Chunk {chunk_info.chunk_index + 1}" if chunk_info.chunk_index >= 0 else "Trecho"
+    return (
+        f"EEG - {chunk_label} "
+        f"({chunk_info.start_time:.1f}s - {chunk_info.end_time:.1f}s) - {channels_info}"
+    )
+
+
+# ---------- MATPLOTLIB ----------
+class MatplotlibRenderer:
+    name = "matplotlib"
+
+    def __init__(self):
+        # pyplot tem estado global: um render por vez (requisições e prefetch)
+        self._lock = threading.Lock()
+
+    def render(self, chunk_info: ChunkInfo, chunk_data: Dict, times: np.ndarray, traces: np.ndarray,
+               width: int, height: int, channels: Optional[List[str]] = None) -> bytes:
+        with self._lock:
+            try:
+                return self._render(chunk_info, chunk_data, times, traces, width, height, channels)
+            except Exception:
+                plt.close('all')
+                raise
+
+    def _render(self, chunk_info: ChunkInfo, chunk_data: Dict, times: np.ndarray, traces: np.ndarray,
+                width: int, height: int, channels: Optional[List[str]]) -> bytes:
+        n_channels = len(chunk_data['channel_names'])
+        channel_height = max(1.5, height / 100 / max(1, n_channels / 8))
+        fig_height = channel_height * n_channels
+
+        fig, axes = plt.subplots(n_channels, 1, figsize=(width/100, fig_height))
+        if n_channels == 1:
+            axes = [axes]
+
+        for i, channel_name in enumerate(chunk_data['channel_names']):
+            signal = traces[i, :]
+            # Tempos por canal (n_channels, n) quando a decimação é LTTB
+            signal_times = times[i] if times.ndim > 1 else times
+
+            axes[i].plot(signal_times, signal, linewidth=0.8, color='blue', alpha=0.8)
+            axes[i].set_ylabel(channel_name, fontsize=9)
+            axes[i].tick_params(axis='both', which='major', labelsize=7)
+            axes[i].grid(True, alpha=0.3)
+            axes[i].set_xlim(chunk_info.start_time, chunk_info.end_time)
+
+        plt.xlabel('Tempo (segundos)', fontsize=10)
+        plt.suptitle(plot_title(chunk_info, chunk_data, channels), fontsize=11)
+        plt.tight_layout()
+
+        buffer = BytesIO()
+        plt.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
+        plt.close(fig)
+        return buffer.getvalue()
+
+
+# ---------- RASTER ----------
+class RasterRenderer:
+    """
+    Desenha os traços direto num buffer NumPy (uint8) e codifica com PIL, sem
+    figuras matplotlib. Cada coluna de pixel recebe o intervalo (min, max) das
+    amostras que caem nela; o fundo (grade, separadores) vem de um template
+    reutilizado por (width, height, n_channels). Não usa estado global, então
+    pode rodar em várias threads ao mesmo tempo.
+    """
+
+    name = "raster"
+
+    MARGIN_LEFT = 56
+    MARGIN_RIGHT = 8
+    MARGIN_TOP = 22
+    MARGIN_BOTTOM = 24
+    # Altura mínima de linha para o rótulo do canal
+    MIN_ROW_HEIGHT = 12
+    BACKGROUND = 255
+    GRID = 225
+    TRACE_COLOR = np.array([40, 60, 200], dtype=np.uint8)
+    TEXT_COLOR = (30, 30, 30)
+    MAX_TEMPLATES = 64
+
+    def __init__(self):
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+        self._font = ImageFont.load_default()
+
+    # ---------- TEMPLATE ----------
+    def _layout(self, width: int, height: int, n_channels: int) -> Dict:
+        key = (width, height, n_channels)
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self._templates.move_to_end(key)
+                return template
+
+        # Altura exata pedida: linhas de 1 px em diante; a sobra vai para a margem
+        # de baixo. Só cresce se não couber nem 1 px por canal.
+        row_height = max(1, (height - self.MARGIN_TOP - self.MARGIN_BOTTOM) // n_channels)
+        total_height = max(height, self.MARGIN_TOP + self.MARGIN_BOTTOM + row_height * n_channels)
+        plot_width = max(1, width - self.MARGIN_LEFT - self.MARGIN_RIGHT)
+        row_tops = self.MARGIN_TOP + row_height * np.arange(n_channels)
+
+        background = np.full((total_height, width), self.BACKGROUND, dtype=np.uint8)
+        x0, x1 = self.MARGIN_LEFT, self.MARGIN_LEFT + plot_width
+        for top in row_tops:
+            background[top, x0:x1] = self.GRID
+            background[top + row_height // 2, x0:x1:2] = self.GRID
+        background[self.MARGIN_TOP + row_height * n_channels - 1, x0:x1] = self.GRID
+        for x in np.linspace(x0, x1 - 1, 11).astype(int):
+            background[self.MARGIN_TOP:self.MARGIN_TOP + row_height * n_channels:2, x] = self.GRID
+
+        template = {
+            'background': background,
+            'x0': x0,
+            'row_height': row_height,
+            'row_tops': row_tops,
+            'plot_width': plot_width,
+            'total_height': total_height,
+        }
+        with self._lock:
+            self._templates[key] = template
+            if len(self._templates) > self.MAX_TEMPLATES:
+                self._templates.popitem(last=False)
+        return template
+
+    # ---------- TRAÇOS ----------
+    @staticmethod
+    def _column_extents(times: np.ndarray, traces: np.ndarray, t0: float, t1: float, plot_width: int):
+        """
+        (min, max) por coluna de pixel para todos os canais de uma vez. `times`
+        é (n,) compartilhado ou (n_channels, n) com tempos por canal.
+        """
+        n_channels = traces.shape[0]
+        span = max(t1 - t0, 1e-12)
+
+        if traces.shape[1] < plot_width:
+            # Menos amostras que pixels: interpola para não deixar colunas vazias
+            columns_t = t0 + (np.arange(plot_width) + 0.5) / plot_width * span
+            times_rows = np.broadcast_to(times, traces.shape)
+            traces = np.stack([np.interp(columns_t, t, trace) for t, trace in zip(times_rows, traces)])
+            times = columns_t
+
+        columns = np.clip(((times - t0) / span * plot_width).astype(np.int64), 0, plot_width - 1)
+        flat = np.broadcast_to(np.arange(n_channels)[:, None] * plot_width + columns, traces.shape).ravel()
+        values = np.asarray(traces, dtype=np.float64).ravel()
+
+        col_min = np.full(n_channels * plot_width, np.inf)
+        col_max = np.full(n_channels * plot_width, -np.inf)
+        np.minimum.at(col_min, flat, values)
+        np.maximum.at(col_max, flat, values)
+        col_min = col_min.reshape(n_channels, plot_width)
+        col_max = col_max.reshape(n_channels, plot_width)
+
+        # Colunas sem amostra herdam a anterior (carry forward)
+        empty = ~np.isfinite(col_min)
+        if empty.any():
+            idx = np.where(~empty, np.arange(plot_width)[None, :], 0)
+            np.maximum.accumulate(idx, axis=1, out=idx)
+            col_min = np.take_along_axis(col_min, idx, axis=1)
+            col_max = np.take_along_axis(col_max, idx, axis=1)
+        return col_min, col_max
+
+    def _draw_traces(self, image: np.ndarray, layout: Dict, col_min: np.ndarray, col_max: np.ndarray,
+                     limits: Optional[tuple] = None):
+        """
+        Pinta os traços. `limits` = (lo, hi), arrays (n_channels,), fixa a
+        escala vertical (tiles); sem ela cada canal usa o próprio min/max.
+        Colunas NaN (sem dados) ficam em branco.
+        """
+        row_height = layout['row_height']
+        # 1 px de folga em cima e embaixo quando a linha comporta
+        pad = 1 if row_height > 3 else 0
+        usable = row_height - 1 - 2 * pad
+
+        valid = np.isfinite(col_min) & np.isfinite(col_max)
+        if limits is None:
+            ch_min = np.nanmin(np.where(valid, col_min, np.nan), axis=1, keepdims=True)
+            ch_max = np.nanmax(np.where(valid, col_max, np.nan), axis=1, keepdims=True)
+        else:
+            ch_min = np.asarray(limits[0], dtype=np.float64)[:, None]
+            ch_max = np.asarray(limits[1], dtype=np.float64)[:, None]
+        scale = np.where(ch_max > ch_min, ch_max - ch_min, 1.0)
+        col_min = np.where(valid, col_min, ch_min)
+        col_max = np.where(valid, col_max, ch_min)
+
+        # y cresce para baixo: valor máximo no topo da linha do canal
+        y_top = np.rint(np.clip((ch_max - col_max) / scale, 0, 1) * usable).astype(np.int64) + pad
+        y_bottom = np.rint(np.clip((ch_max - col_min) / scale, 0, 1) * usable).astype(np.int64) + pad
+
+        # Liga colunas vizinhas para o traço ficar contínuo
+        prev_top = np.concatenate([y_top[:, :1], y_top[:, :-1]], axis=1)
+        prev_bottom = np.concatenate([y_bottom[:, :1], y_bottom[:, :-1]], axis=1)
+        prev_valid = np.concatenate([valid[:, :1], valid[:, :-1]], axis=1)
+        joined = valid & prev_valid
+        y_top = np.where(joined, np.minimum(y_top, prev_bottom), y_top)
+        y_bottom = np.where(joined, np.maximum(y_bottom, prev_top), y_bottom)
+
+        rows = np.arange(row_height)[None, :, None]
+        mask = (rows >= y_top[:, None, :]) & (rows <= y_bottom[:, None, :]) & valid[:, None, :]
+
+        x0 = layout['x0']
+        plot_width = layout['plot_width']
+        for i, top in enumerate(layout['row_tops']):
+            image[top:top + row_height, x0:x0 + plot_width][mask[i]] = self.TRACE_COLOR
+
+    # ---------- RENDER ----------
+    def render(self, chunk_info: ChunkInfo, chunk_data: Dict, times: np.ndarray, traces: np.ndarray,
+               width: int, height: int, channels: Optional[List[str]] = None) -> bytes:
+        n_channels = len(chunk_data['channel_names'])
+        layout = self._layout(width, height, n_channels)
+        t0, t1 = chunk_info.start_time, chunk_info.end_time
+
+        image = np.repeat(layout['background'][:, :, None], 3, axis=2)
+        if traces.shape[1] > 0:
+            col_min, col_max = self._column_extents(times, traces, t0, t1, layout['plot_width'])
+            self._draw_traces(image, layout, col_min, col_max)
+
+        pil_image = Image.fromarray(image, mode="RGB")
+        draw = ImageDraw.Draw(pil_image)
+        draw.text((self.MARGIN_LEFT, 4), plot_title(chunk_info, chunk_data, channels),
+                  fill=self.TEXT_COLOR, font=self._font)
+        # Linhas mais baixas que o texto: rotula só um canal a cada `step`
+        step = -(-self.MIN_ROW_HEIGHT // layout['row_height'])
+        for name, top in list(zip(chunk_data['channel_names'], layout['row_tops']))[::step]:
+            draw.text((4, top + layout['row_height'] // 2 - 5), name[:8], fill=self.TEXT_COLOR, font=self._font)
+
+        axis_y = layout['total_height'] - self.MARGIN_BOTTOM + 6
+        decimals = 1 if t1 - t0 >= 5 else 2 if t1 - t0 >= 0.5 else 3
+        for fraction in np.linspace(0, 1, 6):
+            x = self.MARGIN_LEFT + int(fraction * (layout['plot_width'] - 1))
+            label = f"{t0 + fraction * (t1 - t0):.{decimals}f}s"
+            draw.text((min(x, width - 6 * len(label)), axis_y), label, fill=self.TEXT_COLOR, font=self._font)
+
+        buffer = BytesIO()
+        pil_image.save(buffer, format="PNG", compress_level=1)
+        return buffer.getvalue()
+
+    def render_tile(self, col_min: np.ndarray, col_max: np.ndarray, lo: np.ndarray, hi: np.ndarray,
+                    row_height: int) -> bytes:
+        """
+        Tile sem margens nem texto: uma linha de `row_height` px por canal e
+        uma coluna por bucket, com escala fixa (lo, hi) por canal para que
+        tiles vizinhos se encaixem.
+        """
+        n_channels, width = col_min.shape
+        layout = {
+            'x0': 0,
+            'row_height': row_height,
+            'row_tops': row_height * np.arange(n_channels),
+            'plot_width': width,
+        }
+        image = np.full((row_height * n_channels, width, 3), self.BACKGROUND, dtype=np.uint8)
+        image[layout['row_tops'] + row_height // 2, :] = self.GRID
+        self._draw_traces(image, layout, col_min, col_max, limits=(lo, hi))
+
+        buffer = BytesIO()
+        Image.fromarray(image, mode="RGB").save(buffer, format="PNG", compress_level=1)
+        return buffer.getvalue()
+
+
+renderers = {
+    MatplotlibRenderer.name: MatplotlibRenderer(),
+    RasterRenderer.name: RasterRenderer(),
+}
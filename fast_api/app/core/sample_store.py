@@ -0,0 +1,312 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import mne
+import numpy as np
+
+from .edf_cache import file_fingerprint
+from .pyramid import build_levels, count_levels, level_shapes
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_CONTAINER_PATH = Path(os.getenv("OUTPUT_CONTAINER_PATH", "/tmp/output"))
+SAMPLE_STORE_PATH = Path(os.getenv("SAMPLE_STORE_PATH", str(OUTPUT_CONTAINER_PATH / "samples")))
+SAMPLE_STORE_BLOCK_SECONDS = float(os.getenv("SAMPLE_STORE_BLOCK_SECONDS", "60"))
+SAMPLE_STORE_BUILD_WORKERS = int(os.getenv("SAMPLE_STORE_BUILD_WORKERS", "1"))
+# Matriz float32 + pirâmide ocupam ~6x o EDF: LRU até caber no limite (0 = sem limite)
+SAMPLE_STORE_MAX_BYTES = int(os.getenv("SAMPLE_STORE_MAX_BYTES", str(32 * 1024 ** 3)))
+# Intervalo mínimo entre atualizações do último acesso (mtime do meta.json)
+SAMPLE_STORE_TOUCH_SECONDS = float(os.getenv("SAMPLE_STORE_TOUCH_SECONDS", "60"))
+# Retry-After (s) sugerido aos clientes enquanto a geração roda em background
+SAMPLE_STORE_RETRY_AFTER = int(os.getenv("SAMPLE_STORE_RETRY_AFTER", "5"))
+
+SAMPLES_FILE = "samples.npy"
+META_FILE = "meta.json"
+PYRAMID_FILE = "pyramid_{level}.npy"
+
+
+class SampleStoreNotReady(Exception):
+    """O sample store do arquivo ainda não existe (a geração roda em background)."""
+    pass
+
+
+class SampleStore:
+    """
+    Sidecar binário dos EDFs: uma matriz float32 (n_channels, n_times),
+    channel-major, salva como .npy e aberta com numpy.memmap. Um recorte de
+    tempo de um canal é uma view sem cópia e os workers do uvicorn
+    compartilham o page cache do SO em vez de manter cópias float64 privadas.
+    Junto dela fica a pirâmide de envelopes (min, max) usada nos plots.
+    O mtime do meta.json marca o último acesso; depois de cada geração os
+    stores menos usados (e os de EDFs que não existem mais) são removidos até
+    caber em SAMPLE_STORE_MAX_BYTES. O store recém-gerado nunca é removido.
+    """
+
+    def __init__(self, root: Path = SAMPLE_STORE_PATH, max_bytes: int = SAMPLE_STORE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._touched = {}
+        self._open_entries = {}
+        self._lock = threading.Lock()
+        self._build_locks = {}
+        self._scheduled = {}
+        self._build_pool = None
+
+    def _entry_dir(self, file_path: str) -> Path:
+        digest = hashlib.sha1(os.path.abspath(file_path).encode()).hexdigest()[:16]
+        return self.root / digest
+
+    def _read_meta(self, file_path: str) -> Optional[Dict]:
+        meta_path = self._entry_dir(file_path) / META_FILE
+        if not meta_path.exists():
+            return None
+        try:
+            meta = json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            return None
+        _, size, mtime_ns = file_fingerprint(file_path)
+        if meta.get("file_size") != size or meta.get("file_mtime_ns") != mtime_ns:
+            return None
+        if "pyramid_levels" not in meta:
+            return None
+        return meta
+
+    def is_current(self, file_path: str) -> bool:
+        return self._read_meta(file_path) is not None
+
+    def build(self, file_path: str) -> Path:
+        entry_dir = self._entry_dir(file_path)
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        _, size, mtime_ns = file_fingerprint(file_path)
+
+        raw = mne.io.read_raw_edf(file_path, preload=False, verbose=False)
+        n_channels, n_times = len(raw.ch_names), int(raw.n_times)
+        sfreq = float(raw.info["sfreq"])
+
+        # Escreve em arquivos temporários e publica com os.replace (atômico);
+        # o meta.json vai por último e marca a entrada como completa
+        n_levels = count_levels(n_times)
+        tmp_samples = entry_dir / f".{SAMPLES_FILE}.{os.getpid()}.tmp"
+        tmp_meta = entry_dir / f".{META_FILE}.{os.getpid()}.tmp"
+        tmp_levels = [
+            entry_dir / f".{PYRAMID_FILE.format(level=level)}.{os.getpid()}.tmp"
+            for level in range(1, n_levels + 1)
+        ]
+        try:
+            samples = np.lib.format.open_memmap(
+                tmp_samples, mode="w+", dtype=np.float32, shape=(n_channels, n_times)
+            )
+            block = max(1, int(sfreq * SAMPLE_STORE_BLOCK_SECONDS))
+            for start in range(0, n_times, block):
+                stop = min(start + block, n_times)
+                samples[:, start:stop] = raw.get_data(start=start, stop=stop)
+            samples.flush()
+
+            levels = [
+                np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=shape)
+                for path, shape in zip(tmp_levels, level_shapes(n_channels, n_times, n_levels))
+            ]
+            build_levels(samples, levels)
+            for level in levels:
+                level.flush()
+            del samples, levels
+
+            meta = {
+                "file_path": os.path.abspath(file_path),
+                "file_size": size,
+                "file_mtime_ns": mtime_ns,
+                "channel_names": list(raw.ch_names),
+                "sample_rate": sfreq,
+                "n_times": n_times,
+                "dtype": "float32",
+                "unit": "V",
+                "pyramid_levels": n_levels,
+            }
+            tmp_meta.write_text(json.dumps(meta))
+
+            os.replace(tmp_samples, entry_dir / SAMPLES_FILE)
+            for level, path in enumerate(tmp_levels, start=1):
+                os.replace(path, entry_dir / PYRAMID_FILE.format(level=level))
+            os.replace(tmp_meta, entry_dir / META_FILE)
+        finally:
+            raw.close()
+            for path in [tmp_samples, tmp_meta, *tmp_levels]:
+                path.unlink(missing_ok=True)
+
+        with self._lock:
+            self._open_entries.pop(meta["file_path"], None)
+
+        logger.info(f"Sample store gerado para {file_path}: {n_channels} canais x {n_times} amostras")
+        self._evict(keep=entry_dir)
+        return entry_dir
+
+    # ---------- REMOÇÃO ----------
+    @staticmethod
+    def _published_files(entry_dir: Path) -> List[Path]:
+        # Só arquivos publicados: temporários de uma geração em andamento ficam
+        return [
+            path for path in entry_dir.iterdir()
+            if path.name in (SAMPLES_FILE, META_FILE) or (path.name.startswith("pyramid_") and path.suffix == ".npy")
+        ]
+
+    def _remove_dir(self, entry_dir: Path):
+        # meta.json primeiro: sem ele a entrada deixa de ser válida em todos os workers
+        (entry_dir / META_FILE).unlink(missing_ok=True)
+        for path in self._published_files(entry_dir):
+            path.unlink(missing_ok=True)
+        try:
+            entry_dir.rmdir()
+        except OSError:
+            pass
+
+    def remove(self, file_path: str):
+        """Remove o store de um EDF (registro removido ou arquivo trocado)."""
+        path = os.path.abspath(file_path)
+        with self._lock:
+            build_lock = self._build_locks.setdefault(path, threading.Lock())
+        with build_lock:
+            entry_dir = self._entry_dir(file_path)
+            if entry_dir.exists():
+                self._remove_dir(entry_dir)
+        with self._lock:
+            self._open_entries.pop(path, None)
+            self._touched.pop(path, None)
+
+    def _evict(self, keep: Optional[Path] = None):
+        """Remove stores órfãos e depois os menos usados até caber no limite (desce até 90%)."""
+        if self.max_bytes <= 0 or not self.root.exists():
+            return
+        entries = []
+        total = 0
+        orphans = 0
+        for entry_dir in self.root.iterdir():
+            meta_path = entry_dir / META_FILE
+            try:
+                meta = json.loads(meta_path.read_text())
+                last_access = meta_path.stat().st_mtime_ns
+                size = sum(path.stat().st_size for path in self._published_files(entry_dir))
+            except (OSError, ValueError):
+                # Sem meta.json: geração em andamento (ou lixo de uma que falhou)
+                continue
+            if entry_dir != keep and not os.path.exists(meta.get("file_path", "")):
+                self._remove_dir(entry_dir)
+                orphans += 1
+                continue
+            entries.append((last_access, size, entry_dir))
+            total += size
+
+        removed = 0
+        if total > self.max_bytes:
+            target = int(self.max_bytes * 0.9)
+            for _, size, entry_dir in sorted(entries):
+                if total <= target:
+                    break
+                if entry_dir == keep:
+                    continue
+                self._remove_dir(entry_dir)
+                total -= size
+                removed += 1
+        if removed or orphans:
+            logger.info(f"Sample store: {removed} removidos (LRU), {orphans} de EDFs inexistentes")
+
+    def ensure(self, file_path: str) -> bool:
+        # Usado como tarefa de background na ingestão: nunca propaga erro
+        with self._lock:
+            build_lock = self._build_locks.setdefault(os.path.abspath(file_path), threading.Lock())
+        try:
+            # Uma geração por arquivo: os temporários usam o mesmo nome no processo
+            with build_lock:
+                if not self.is_current(file_path):
+                    self.build(file_path)
+            return True
+        except Exception as e:
+            logger.warning(f"Não foi possível gerar sample store para {file_path}: {e}")
+            return False
+
+    def schedule(self, file_path: str) -> bool:
+        """
+        Enfileira ensure() em background, sem bloquear quem chama (rotas HTTP).
+        Retorna False se o arquivo já tem uma geração pendente.
+        """
+        path = os.path.abspath(file_path)
+        with self._lock:
+            pending = self._scheduled.get(path)
+            if pending is not None and not pending.done():
+                return False
+            if self._build_pool is None:
+                self._build_pool = ThreadPoolExecutor(
+                    max_workers=SAMPLE_STORE_BUILD_WORKERS, thread_name_prefix="sample-store"
+                )
+            self._scheduled[path] = self._build_pool.submit(self.ensure, file_path)
+            # Descarta gerações já concluídas
+            self._scheduled = {p: f for p, f in self._scheduled.items() if not f.done()}
+            return True
+
+    def shutdown(self):
+        if self._build_pool is not None:
+            self._build_pool.shutdown(wait=False, cancel_futures=True)
+            self._build_pool = None
+
+    def _touch(self, path: str):
+        """Atualiza o último acesso (LRU) no máximo a cada SAMPLE_STORE_TOUCH_SECONDS."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._touched.get(path, float("-inf")) < SAMPLE_STORE_TOUCH_SECONDS:
+                return
+            self._touched[path] = now
+        try:
+            os.utime(self._entry_dir(path) / META_FILE)
+        except OSError:
+            pass
+
+    def open(self, file_path: str) -> Optional[Dict]:
+        path = os.path.abspath(file_path)
+        meta = self._read_meta(file_path)
+        if meta is None:
+            return None
+
+        self._touch(path)
+        with self._lock:
+            entry = self._open_entries.get(path)
+            if entry and entry["file_mtime_ns"] == meta["file_mtime_ns"]:
+                return entry
+
+        entry_dir = self._entry_dir(file_path)
+        data = np.load(entry_dir / SAMPLES_FILE, mmap_mode="r")
+        levels = {
+            level: np.load(entry_dir / PYRAMID_FILE.format(level=level), mmap_mode="r")
+            for level in range(1, meta["pyramid_levels"] + 1)
+        }
+        entry = {
+            "data": data,
+            "levels": levels,
+            "pyramid_levels": meta["pyramid_levels"],
+            "channel_names": meta["channel_names"],
+            "sample_rate": meta["sample_rate"],
+            "n_times": meta["n_times"],
+            "file_mtime_ns": meta["file_mtime_ns"],
+        }
+        with self._lock:
+            self._open_entries[path] = entry
+        return entry
+
+    @staticmethod
+    def read_window(entry: Dict, start: int, stop: int, channel_indices: Optional[List[int]] = None) -> np.ndarray:
+        data = entry["data"]
+        if channel_indices is None:
+            return data[:, start:stop]
+        first = channel_indices[0] if channel_indices else 0
+        if list(channel_indices) == list(range(first, first + len(channel_indices))):
+            # Canais contíguos: fatia simples, view sem cópia sobre o memmap
+            return data[first:first + len(channel_indices), start:stop]
+        return data[channel_indices, start:stop]
+
+
+sample_store = SampleStore()
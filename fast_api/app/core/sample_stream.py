@@ -0,0 +1,144 @@
+import os
+import struct
+from typing import Dict, Iterator, List
+
+import numpy as np
+
+STREAM_BLOCK_SAMPLES = int(os.getenv("STREAM_BLOCK_SAMPLES", "65536"))
+
+MAGIC = b"MEEG"
+VERSION = 1
+DTYPE_CODES = {"float32": 1, "int16": 2}
+NUMPY_DTYPES = {"float32": np.dtype("<f4"), "int16": np.dtype("<i2")}
+
+# magic, versão, dtype, n_channels, n_samples, sample_rate, start_time, tamanho dos nomes
+HEADER_STRUCT = struct.Struct("<4sBBHIddI")
+INT16_MAX = 32767
+
+
+class SampleStreamEncoder:
+    """
+    Formato binário compacto (little-endian) para amostras de um chunk:
+
+        header   HEADER_STRUCT
+        nomes    UTF-8 separados por '\\n'
+        escalas  int16: n_channels x (scale float32, offset float32)
+        dados    channel-major: todas as amostras do canal 0, depois do canal 1...
+
+    Em int16 o valor físico (V) é `valor * scale + offset`.
+    """
+
+    def __init__(self, data: np.ndarray, channel_names: List[str], sample_rate: float,
+                 start_time: float, fmt: str = "float32"):
+        if fmt not in DTYPE_CODES:
+            raise ValueError(f"Formato inválido: {fmt}")
+        self.data = data
+        self.channel_names = channel_names
+        self.sample_rate = sample_rate
+        self.start_time = start_time
+        self.fmt = fmt
+        self.dtype = NUMPY_DTYPES[fmt]
+        self.scales = self._compute_scales() if fmt == "int16" else None
+
+    def _compute_scales(self) -> np.ndarray:
+        scales = np.empty((self.data.shape[0], 2), dtype="<f4")
+        for i in range(self.data.shape[0]):
+            ch_min, ch_max = float(self.data[i].min()), float(self.data[i].max())
+            offset = (ch_max + ch_min) / 2
+            scale = (ch_max - ch_min) / (2 * INT16_MAX)
+            scales[i] = (scale if scale > 0 else 1.0, offset)
+        return scales
+
+    def header(self) -> bytes:
+        names = "\n".join(self.channel_names).encode("utf-8")
+        header = HEADER_STRUCT.pack(
+            MAGIC, VERSION, DTYPE_CODES[self.fmt],
+            self.data.shape[0], self.data.shape[1],
+            float(self.sample_rate), float(self.start_time), len(names)
+        )
+        scales = self.scales.tobytes() if self.scales is not None else b""
+        return header + names + scales
+
+    def content_length(self) -> int:
+        return len(self.header()) + self.data.shape[0] * self.data.shape[1] * self.dtype.itemsize
+
+    def _encode_block(self, channel: int, block: np.ndarray) -> bytes:
+        if self.scales is None:
+            return block.astype(self.dtype, copy=False).tobytes()
+        scale, offset = self.scales[channel]
+        counts = np.rint((block - offset) / scale)
+        return np.clip(counts, -INT16_MAX, INT16_MAX).astype(self.dtype).tobytes()
+
+    def iter_bytes(self, block_samples: int = STREAM_BLOCK_SAMPLES) -> Iterator[bytes]:
+        yield self.header()
+        n_samples = self.data.shape[1]
+        for channel in range(self.data.shape[0]):
+            for start in range(0, n_samples, block_samples):
+                yield self._encode_block(channel, self.data[channel, start:start + block_samples])
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            "Content-Length": str(self.content_length()),
+            "X-EEG-Format": self.fmt,
+            "X-EEG-Channels": str(self.data.shape[0]),
+            "X-EEG-Samples": str(self.data.shape[1]),
+            "X-EEG-Sample-Rate": str(self.sample_rate),
+        }
+
+
+POLYLINE_MAGIC = b"MPLY"
+POLYLINE_VERSION = 1
+POLYLINE_SHARED_X = 0
+POLYLINE_PER_CHANNEL_X = 1
+
+# magic, versão, layout de x, n_channels, n_points, start_time, end_time, tamanho dos nomes
+POLYLINE_HEADER_STRUCT = struct.Struct("<4sBBHIddI")
+
+
+class PolylineEncoder:
+    """
+    Polilinhas já decimadas para desenho no cliente (WebGL), little-endian:
+
+        header   POLYLINE_HEADER_STRUCT
+        nomes    UTF-8 separados por '\n'
+        offsets  float32 x n_channels (centro de cada canal)
+        escalas  float32 x n_channels (2 / amplitude: (y - offset) * escala cabe em [-1, 1])
+        x        float32, segundos desde start_time: n_points (layout 0, compartilhado)
+                 ou n_channels x n_points (layout 1, LTTB)
+        y        float32, n_channels x n_points, channel-major, valores originais
+
+    O cliente empilha os canais aplicando offset/escala no shader.
+    """
+
+    def __init__(self, times: np.ndarray, traces: np.ndarray, channel_names: List[str],
+                 start_time: float, end_time: float):
+        self.times = np.asarray(times, dtype=np.float64)
+        self.traces = np.asarray(traces)
+        self.channel_names = channel_names
+        self.start_time = start_time
+        self.end_time = end_time
+
+        ch_min = self.traces.min(axis=1) if self.traces.shape[1] else np.zeros(self.traces.shape[0])
+        ch_max = self.traces.max(axis=1) if self.traces.shape[1] else np.zeros(self.traces.shape[0])
+        amplitude = ch_max - ch_min
+        self.offsets = ((ch_max + ch_min) / 2).astype("<f4")
+        self.scales = np.divide(2.0, amplitude, out=np.ones_like(amplitude), where=amplitude > 0).astype("<f4")
+
+    def to_bytes(self) -> bytes:
+        n_channels, n_points = self.traces.shape
+        layout = POLYLINE_PER_CHANNEL_X if self.times.ndim > 1 else POLYLINE_SHARED_X
+        names = "\n".join(self.channel_names).encode("utf-8")
+        header = POLYLINE_HEADER_STRUCT.pack(
+            POLYLINE_MAGIC, POLYLINE_VERSION, layout, n_channels, n_points,
+            float(self.start_time), float(self.end_time), len(names)
+        )
+        x = (self.times - self.start_time).astype("<f4")
+        y = np.ascontiguousarray(self.traces, dtype="<f4")
+        return b"".join([header, names, self.offsets.tobytes(), self.scales.tobytes(), x.tobytes(), y.tobytes()])
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            "X-EEG-Format": "polyline-float32",
+            "X-EEG-Channels": str(self.traces.shape[0]),
+            "X-EEG-Points": str(self.traces.shape[1]),
+        }
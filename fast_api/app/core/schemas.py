@@ -145,6 +145,8 @@ class EEGChunkInfo(BaseModel):
     end_time: float
     duration: float
     is_full_chunk: bool
+    start_sample: Optional[int] = None
+    stop_sample: Optional[int] = None
 
 class EEGChunksSummaryResponse(BaseModel):
     edf_file_id: uuid.UUID
@@ -154,10 +156,21 @@ class EEGChunksSummaryResponse(BaseModel):
 
 class EEGChunkRequest(BaseModel):
     edf_file_id: uuid.UUID
-    chunk_index: int
+    # chunk_index (chunks fixos) ou start_time/end_time (time range em segundos)
+    chunk_index: Optional[int] = Field(None, ge=0)
+    start_time: Optional[float] = Field(None, ge=0)
+    end_time: Optional[float] = Field(None, gt=0)
     width: int = 800
     height: int = 400
     channels: Optional[List[str]] = None
+    target_samples: Optional[int] = Field(None, gt=0)
+    # "matplotlib" ou "raster"; None usa EEG_PLOT_RENDERER
+    renderer: Optional[str] = None
+    # "minmax" ou "lttb"; None usa PLOT_DECIMATION
+    decimation: Optional[str] = None
+
+class EEGPlotBatchRequest(BaseModel):
+    requests: List[EEGChunkRequest] = Field(..., min_length=1, max_length=64)
 
 class EEGChunksResponse(BaseModel):
     edf_file_id: uuid.UUID
@@ -167,6 +180,15 @@ class EEGChunksResponse(BaseModel):
     chunks: List[EEGChunkInfo]
     chunk_count: int
 
+class EEGChunkEnvelopeResponse(BaseModel):
+    chunk_info: EEGChunkInfo
+    level: int
+    bucket_size: int
+    sample_frequency: float
+    times: List[float]
+    data_min: Dict[str, List[float]]
+    data_max: Dict[str, List[float]]
+
 class EEGPlotResponse(BaseModel):
     png_data: str
     chunk_info: EEGChunkInfo
@@ -0,0 +1,195 @@
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Dict, List, Optional
+
+import matplotlib
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from scipy.signal import spectrogram, welch
+
+from .chunks import ChunkInfo, chunk_manager
+from .edf_cache import file_fingerprint
+
+SPECTRAL_CACHE_BYTES = int(os.getenv("SPECTRAL_CACHE_BYTES", str(256 * 1024 * 1024)))
+SPECTRAL_KINDS = ("psd", "spectrogram")
+# Faixa de cores dos heatmaps: percentis do espectro em dB
+HEATMAP_PERCENTILES = (2, 98)
+
+
+class SpectralAnalyzer:
+    """
+    PSD (Welch) e espectrograma (STFT) de um trecho, calculados de uma vez
+    para todos os canais selecionados. O resultado completo (todas as
+    frequências, float32) fica num cache LRU limitado em bytes, com chave
+    (fingerprint do EDF, amostras do trecho, canais, parâmetros da janela);
+    recortes de frequência, colormaps e tamanhos de imagem reaproveitam o
+    mesmo espectro sem refazer a FFT.
+    """
+
+    def __init__(self, max_bytes: int = SPECTRAL_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    # ---------- CÁLCULO ----------
+    def compute(
+        self,
+        kind: str,
+        file_path: str,
+        chunk_info: ChunkInfo,
+        channels: Optional[List[str]] = None,
+        nperseg: Optional[int] = None,
+        noverlap: Optional[int] = None
+    ) -> Dict:
+        if kind not in SPECTRAL_KINDS:
+            raise ValueError(f"Tipo de espectro inválido: {kind}. Opções: {list(SPECTRAL_KINDS)}")
+
+        edf_info = chunk_manager.read_edf_info(file_path)
+        sfreq = edf_info['sample_rate']
+        # Padrão: janelas de 2 s no PSD (0,5 Hz de resolução) e de 1 s no espectrograma
+        nperseg = nperseg or int(round(sfreq * (2 if kind == "psd" else 1)))
+        noverlap = nperseg // 2 if noverlap is None else noverlap
+        if noverlap >= nperseg:
+            raise ValueError("noverlap deve ser menor que nperseg")
+
+        channel_key = tuple(channels) if channels else None
+        range_key = (chunk_info.start_time, chunk_info.end_time, chunk_info.start_sample, chunk_info.stop_sample)
+        key = (file_fingerprint(file_path), kind, range_key, channel_key, nperseg, noverlap)
+
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                return cached
+
+        chunk_data = chunk_manager.get_chunk_data(file_path, chunk_info, channels)
+        data = chunk_data['data']
+        if data.shape[1] < nperseg:
+            raise ValueError(
+                f"Trecho com {data.shape[1]} amostras é menor que a janela (nperseg={nperseg})"
+            )
+
+        if kind == "psd":
+            freqs, power = welch(data, fs=sfreq, nperseg=nperseg, noverlap=noverlap, axis=-1)
+            times = None
+        else:
+            freqs, times, power = spectrogram(data, fs=sfreq, nperseg=nperseg, noverlap=noverlap, axis=-1)
+            times = times + chunk_data['times'][0]
+
+        result = {
+            'kind': kind,
+            'freqs': freqs.astype(np.float32),
+            'times': times.astype(np.float32) if times is not None else None,
+            'power': power.astype(np.float32),
+            'channel_names': chunk_data['channel_names'],
+            'sample_rate': sfreq,
+            'nperseg': nperseg,
+            'noverlap': noverlap,
+            'start_time': chunk_info.start_time,
+            'end_time': chunk_info.end_time,
+        }
+        self._store(key, result)
+        return result
+
+    def _store(self, key, result: Dict):
+        size = result['power'].nbytes
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = result
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted['power'].nbytes
+
+    @staticmethod
+    def crop(result: Dict, fmin: Optional[float] = None, fmax: Optional[float] = None) -> Dict:
+        """Recorte de frequências (view do array em cache, sem cópia)."""
+        freqs = result['freqs']
+        lo = int(np.searchsorted(freqs, fmin, side="left")) if fmin is not None else 0
+        hi = int(np.searchsorted(freqs, fmax, side="right")) if fmax is not None else len(freqs)
+        if hi <= lo:
+            raise ValueError("Faixa de frequências vazia")
+        return {**result, 'freqs': freqs[lo:hi], 'power': result['power'][:, lo:hi]}
+
+    # ---------- HEATMAPS ----------
+    @staticmethod
+    def _colormap_lut(colormap: str) -> np.ndarray:
+        if colormap not in matplotlib.colormaps:
+            raise ValueError(f"Colormap inválido: {colormap}")
+        return (matplotlib.colormaps[colormap](np.linspace(0, 1, 256))[:, :3] * 255).astype(np.uint8)
+
+    @staticmethod
+    def _to_db(power: np.ndarray) -> np.ndarray:
+        return 10 * np.log10(np.maximum(power, np.finfo(np.float32).tiny))
+
+    @staticmethod
+    def _resample(matrix: np.ndarray, rows: int, cols: int) -> np.ndarray:
+        """Vizinho mais próximo para (rows, cols); funciona para ampliar e reduzir."""
+        row_idx = (np.arange(rows) * matrix.shape[0] / rows).astype(np.int64)
+        col_idx = (np.arange(cols) * matrix.shape[1] / cols).astype(np.int64)
+        return matrix[row_idx[:, None], col_idx[None, :]]
+
+    def render(self, result: Dict, width: int, height: int, colormap: str = "viridis") -> bytes:
+        """
+        Heatmap em dB. PSD: uma linha por canal, frequência no eixo x.
+        Espectrograma: um painel por canal, tempo no eixo x e frequência
+        crescendo para cima.
+        """
+        lut = self._colormap_lut(colormap)
+        power_db = self._to_db(result['power'])
+        vmin, vmax = np.percentile(power_db, HEATMAP_PERCENTILES)
+        span = vmax - vmin if vmax > vmin else 1.0
+        n_channels = power_db.shape[0]
+
+        if result['kind'] == "psd":
+            matrix = power_db
+            panel_rows = [self._resample(matrix, max(height, n_channels), width)]
+        else:
+            panel_height = max(8, height // n_channels)
+            panel_rows = []
+            for channel in power_db:
+                # (freqs, times) -> linhas de pixel com a frequência baixa embaixo
+                panel_rows.append(self._resample(channel[::-1], panel_height - 1, width))
+                panel_rows.append(np.full((1, width), np.nan))
+
+        values = np.concatenate(panel_rows, axis=0)
+        indices = np.clip((values - vmin) / span * 255, 0, 255)
+        image = lut[np.nan_to_num(indices, nan=0).astype(np.uint8)]
+        image[np.isnan(values)] = 255
+
+        pil_image = Image.fromarray(image, mode="RGB")
+        draw = ImageDraw.Draw(pil_image)
+        font = ImageFont.load_default()
+        row_height = pil_image.height / n_channels if result['kind'] == "psd" else panel_height
+        for i, name in enumerate(result['channel_names']):
+            draw.text((3, int(i * row_height) + 1), name, fill=(255, 255, 255), font=font)
+
+        buffer = BytesIO()
+        pil_image.save(buffer, format="PNG", compress_level=1)
+        return buffer.getvalue()
+
+    @staticmethod
+    def to_dict(result: Dict) -> Dict:
+        """Arrays crus (listas) para resposta JSON; potência em V²/Hz."""
+        return {
+            'kind': result['kind'],
+            'channel_names': result['channel_names'],
+            'sample_frequency': result['sample_rate'],
+            'nperseg': result['nperseg'],
+            'noverlap': result['noverlap'],
+            'start_time': result['start_time'],
+            'end_time': result['end_time'],
+            'freqs': result['freqs'].tolist(),
+            'times': result['times'].tolist() if result['times'] is not None else None,
+            'power': {
+                name: result['power'][i].tolist()
+                for i, name in enumerate(result['channel_names'])
+            },
+        }
+
+
+spectral_analyzer = SpectralAnalyzer()
@@ -0,0 +1,173 @@
+import hashlib
+import math
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .edf_cache import file_fingerprint
+from .plot_cache import plot_cache
+from .pyramid import reduce_envelope
+from .renderers import renderers
+from .sample_store import sample_store, SampleStoreNotReady
+
+# Tiles de tamanho fixo: TILE_WIDTH colunas x TILE_CHANNELS canais de TILE_ROW_HEIGHT px
+TILE_WIDTH = int(os.getenv("PLOT_TILE_WIDTH", "256"))
+TILE_CHANNELS = int(os.getenv("PLOT_TILE_CHANNELS", "8"))
+TILE_ROW_HEIGHT = int(os.getenv("PLOT_TILE_ROW_HEIGHT", "32"))
+# Percentis do envelope usados na escala global de cada canal (ignoram artefatos extremos)
+TILE_SCALE_PERCENTILES = (0.5, 99.5)
+
+
+class TileService:
+    """
+    Plot em tiles, como mapas: (zoom, time_tile, channel_block). No zoom z
+    cada coluna de pixel é um bucket de 2**z amostras, ou seja, o nível z da
+    pirâmide min/max do sample store; um tile cobre TILE_WIDTH * 2**z
+    amostras de TILE_CHANNELS canais. A escala vertical é global por canal,
+    então os tiles se encaixam ao navegar e servem para qualquer seleção de
+    canais. Os tiles ficam no cache de plots em disco.
+    """
+
+    def __init__(self, cache=plot_cache):
+        self.cache = cache
+        self._scales = {}
+        self._lock = threading.Lock()
+
+    def _open(self, file_path: str) -> Dict:
+        entry = sample_store.open(file_path)
+        if entry is None:
+            # Tiles dependem da pirâmide, gerada em background na ingestão e
+            # nunca durante uma requisição de tile
+            raise SampleStoreNotReady(f"Pirâmide ainda não gerada para {file_path}")
+        return entry
+
+    @staticmethod
+    def max_zoom(n_times: int) -> int:
+        """Menor zoom em que a gravação inteira cabe em um tile."""
+        return max(0, math.ceil(math.log2(max(n_times, 1) / TILE_WIDTH)))
+
+    def describe(self, file_path: str) -> Dict:
+        entry = self._open(file_path)
+        n_times, sfreq = entry['n_times'], entry['sample_rate']
+        lo, hi = self._channel_scales(file_path, entry)
+        max_zoom = self.max_zoom(n_times)
+        return {
+            'tile_width': TILE_WIDTH,
+            'tile_height': TILE_CHANNELS * TILE_ROW_HEIGHT,
+            'channels_per_tile': TILE_CHANNELS,
+            'row_height': TILE_ROW_HEIGHT,
+            'sample_frequency': sfreq,
+            'n_times': n_times,
+            'duration': n_times / sfreq,
+            'max_zoom': max_zoom,
+            'zoom_levels': [
+                {
+                    'zoom': zoom,
+                    'seconds_per_tile': TILE_WIDTH * (1 << zoom) / sfreq,
+                    'time_tiles': math.ceil(n_times / (TILE_WIDTH * (1 << zoom))),
+                }
+                for zoom in range(max_zoom + 1)
+            ],
+            'channel_blocks': [
+                entry['channel_names'][i:i + TILE_CHANNELS]
+                for i in range(0, len(entry['channel_names']), TILE_CHANNELS)
+            ],
+            'scale_min': dict(zip(entry['channel_names'], lo.tolist())),
+            'scale_max': dict(zip(entry['channel_names'], hi.tolist())),
+        }
+
+    def _channel_scales(self, file_path: str, entry: Dict):
+        path = os.path.abspath(file_path)
+        with self._lock:
+            cached = self._scales.get(path)
+            if cached and cached[0] == entry['file_mtime_ns']:
+                return cached[1]
+
+        # Nível mais grosso da pirâmide: poucos milhares de buckets por canal
+        if entry['pyramid_levels']:
+            top = np.asarray(entry['levels'][entry['pyramid_levels']])
+            data_min, data_max = top[..., 0], top[..., 1]
+        else:
+            data_min = data_max = np.asarray(entry['data'])
+        lo = np.percentile(data_min, TILE_SCALE_PERCENTILES[0], axis=1)
+        hi = np.percentile(data_max, TILE_SCALE_PERCENTILES[1], axis=1)
+        scales = (lo, hi)
+
+        with self._lock:
+            self._scales[path] = (entry['file_mtime_ns'], scales)
+        return scales
+
+    def validate(self, file_path: str, zoom: int, time_tile: int, channel_block: int):
+        """Levanta LookupError para coordenadas fora da grade."""
+        entry = self._open(file_path)
+        max_zoom = self.max_zoom(entry['n_times'])
+        if not 0 <= zoom <= max_zoom:
+            raise LookupError(f"Zoom {zoom} não existe. Zooms válidos: 0 a {max_zoom}")
+        n_tiles = math.ceil(entry['n_times'] / (TILE_WIDTH * (1 << zoom)))
+        if not 0 <= time_tile < n_tiles:
+            raise LookupError(f"Tile {time_tile} não existe no zoom {zoom}. Tiles: {n_tiles}")
+        n_blocks = math.ceil(len(entry['channel_names']) / TILE_CHANNELS)
+        if not 0 <= channel_block < n_blocks:
+            raise LookupError(f"Bloco de canais {channel_block} não existe. Blocos: {n_blocks}")
+
+    @staticmethod
+    def tile_key(file_path: str, zoom: int, time_tile: int, channel_block: int) -> str:
+        path, size, mtime_ns = file_fingerprint(file_path)
+        key_string = (
+            f"tile_{path}_{size}_{mtime_ns}_{zoom}_{time_tile}_{channel_block}_"
+            f"{TILE_WIDTH}_{TILE_CHANNELS}_{TILE_ROW_HEIGHT}"
+        )
+        return hashlib.sha256(key_string.encode()).hexdigest()
+
+    def get_tile(self, file_path: str, zoom: int, time_tile: int, channel_block: int) -> Dict:
+        self.validate(file_path, zoom, time_tile, channel_block)
+        key = self.tile_key(file_path, zoom, time_tile, channel_block)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            return {'key': key, 'png': cached['png'], 'channels': cached['channels_plotted']}
+
+        entry = self._open(file_path)
+        channel_indices = list(range(
+            channel_block * TILE_CHANNELS,
+            min((channel_block + 1) * TILE_CHANNELS, len(entry['channel_names']))
+        ))
+        col_min, col_max = self._columns(entry, zoom, time_tile, channel_indices)
+        lo, hi = self._channel_scales(file_path, entry)
+        png = renderers["raster"].render_tile(
+            col_min, col_max, lo[channel_indices], hi[channel_indices], TILE_ROW_HEIGHT
+        )
+        channels = [entry['channel_names'][i] for i in channel_indices]
+        self.cache.put(key, file_path, png, channels)
+        return {'key': key, 'png': png, 'channels': channels}
+
+    @staticmethod
+    def _columns(entry: Dict, zoom: int, time_tile: int, channel_indices: List[int]):
+        """(min, max) de cada coluna do tile, (n_channels, TILE_WIDTH); NaN além do fim."""
+        # Lê do nível da pirâmide mais próximo e reduz o restante em memória
+        base = min(zoom, entry['pyramid_levels'])
+        factor = 1 << (zoom - base)
+        first = time_tile * TILE_WIDTH * factor
+        stop = first + TILE_WIDTH * factor
+
+        if base == 0:
+            window = sample_store.read_window(entry, first, min(stop, entry['n_times']), channel_indices)
+            data_min = data_max = np.asarray(window, dtype=np.float64)
+        else:
+            window = np.asarray(entry['levels'][base][channel_indices, first:stop], dtype=np.float64)
+            data_min, data_max = window[..., 0], window[..., 1]
+
+        for _ in range(zoom - base):
+            data_min, data_max = reduce_envelope(data_min, data_max)
+
+        n_columns = data_min.shape[1]
+        if n_columns < TILE_WIDTH:
+            pad = ((0, 0), (0, TILE_WIDTH - n_columns))
+            data_min = np.pad(data_min, pad, constant_values=np.nan)
+            data_max = np.pad(data_max, pad, constant_values=np.nan)
+        return data_min, data_max
+
+
+tile_service = TileService()
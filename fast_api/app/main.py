@@ -1,6 +1,9 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from app.core.executor import eeg_executor
+from app.core.plots import plot_generator
+from app.core.sample_store import sample_store
 from app.api import (
         edf_files,
         patient_metadata,
@@ -19,6 +22,9 @@ async def lifespan(app: FastAPI):
     # Inits (DB pool warmup, caches, etc.)
     yield
     # Finalizações (fechar conexões, etc.)
+    plot_generator.shutdown()
+    sample_store.shutdown()
+    eeg_executor.shutdown()
 
 app = FastAPI(
     title="EDF Files API",
@@ -0,0 +1,41 @@
+"""Decimação LTTB: extremos preservados e exatamente n_out pontos."""
+import numpy as np
+import pytest
+
+from app.core.plots import decimate_lttb
+
+
+@pytest.mark.parametrize("n_samples, n_out", [(10_000, 500), (1_001, 1_000), (257, 3)])
+def test_lttb_keeps_endpoints_and_target_count(n_samples, n_out):
+    rng = np.random.default_rng(n_samples)
+    times = np.arange(n_samples) / 256.0
+    data = rng.standard_normal((4, n_samples)).cumsum(axis=1)
+
+    out_times, out_data = decimate_lttb(times, data, n_out)
+
+    assert out_data.shape == (4, n_out)
+    assert out_times.shape == (4, n_out)
+    np.testing.assert_array_equal(out_data[:, 0], data[:, 0])
+    np.testing.assert_array_equal(out_data[:, -1], data[:, -1])
+    np.testing.assert_array_equal(out_times[:, 0], times[0])
+    np.testing.assert_array_equal(out_times[:, -1], times[-1])
+    # Pontos escolhidos são amostras originais, em ordem crescente de tempo
+    assert np.all(np.diff(out_times, axis=1) > 0)
+    for ch in range(4):
+        indices = np.round(out_times[ch] * 256.0).astype(int)
+        np.testing.assert_array_equal(out_data[ch], data[ch, indices])
+
+
+def test_lttb_keeps_spike():
+    times = np.arange(5_000, dtype=np.float64)
+    data = np.zeros((1, 5_000))
+    data[0, 2_345] = 10.0
+    _, out_data = decimate_lttb(times, data, 100)
+    assert out_data.max() == 10.0
+
+
+def test_lttb_returns_input_when_already_small():
+    times = np.arange(50, dtype=np.float64)
+    data = np.ones((2, 50))
+    out_times, out_data = decimate_lttb(times, data, 100)
+    assert out_times is times and out_data is data
@@ -0,0 +1,130 @@
+"""
+Desvio numérico do modo float32 (EEG_DTYPE=float32) em relação ao caminho
+float64: pré-processamento, filtros, leitura de chunks e features.
+"""
+import os
+
+# app.core.features importa a sessão do banco; não é usada nestes testes
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import edfio
+import mne
+import numpy as np
+import pytest
+
+from app.core.chunks import chunk_manager
+from app.core.features import extract_features_from_signal
+from app.core.filters import filter_data
+from app.core.precision import resolve_dtype
+from app.core.preprocessing import validate_and_preprocess
+
+SFREQ = 256.0
+DURATION = 60
+CH_NAMES = ["Fp1", "Fp2", "C3", "C4", "O1", "O2"]
+
+# Limites relativos à amplitude máxima do sinal em float64
+PREPROCESS_TOLERANCE = 1e-5
+FILTER_TOLERANCE = 1e-5
+CHUNK_TOLERANCE = 1e-6
+FEATURE_TOLERANCE = 1e-4
+
+
+def _relative_error(reference: np.ndarray, value: np.ndarray) -> float:
+    return float(np.max(np.abs(reference - value.astype(np.float64))) / np.max(np.abs(reference)))
+
+
+@pytest.fixture(scope="module")
+def edf_path(tmp_path_factory):
+    rng = np.random.default_rng(0)
+    times = np.arange(int(SFREQ * DURATION)) / SFREQ
+    data = np.stack([
+        # Alfa + teta + rede elétrica + ruído, em volts, com offset DC
+        20e-6 * np.sin(2 * np.pi * 10 * times + i)
+        + 10e-6 * np.sin(2 * np.pi * 6 * times)
+        + 5e-6 * np.sin(2 * np.pi * 50 * times)
+        + 3e-6 * rng.standard_normal(len(times))
+        + 40e-6 * i
+        for i in range(len(CH_NAMES))
+    ])
+    # edfio direto (e não mne.export): não depende do exportador de cada versão do MNE
+    signals = [
+        edfio.EdfSignal(channel * 1e6, SFREQ, label=name, physical_dimension="uV")
+        for name, channel in zip(CH_NAMES, data)
+    ]
+    path = tmp_path_factory.mktemp("edf") / "float32_test.edf"
+    edfio.Edf(signals).write(path)
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def preprocessed(edf_path):
+    raw64, stats64 = validate_and_preprocess(edf_path, dtype="float64", return_stats=True, use_cache=False)
+    raw32, stats32 = validate_and_preprocess(edf_path, dtype="float32", return_stats=True, use_cache=False)
+    return raw64, stats64, raw32, stats32
+
+
+def test_resolve_dtype_rejects_non_float():
+    assert resolve_dtype("float32") == np.float32
+    with pytest.raises(ValueError):
+        resolve_dtype("int16")
+
+
+def test_preprocess_float32_matches_float64(preprocessed):
+    raw64, stats64, raw32, stats32 = preprocessed
+    assert raw64.get_data().dtype == np.float64
+    assert raw32._data.dtype == np.float32
+    assert _relative_error(raw64._data, raw32._data) < PREPROCESS_TOLERANCE
+    np.testing.assert_allclose(stats32["center"], stats64["center"], rtol=PREPROCESS_TOLERANCE)
+    np.testing.assert_allclose(stats32["scale"], stats64["scale"], rtol=PREPROCESS_TOLERANCE)
+    assert stats32["quality"]["issues"] == stats64["quality"]["issues"]
+
+
+@pytest.mark.parametrize("mode, config", [
+    ("standard", None),
+    ("custom", {"highpass": 0.5, "lowpass": 30.0, "notch": [50.0]}),
+])
+def test_filters_float32_matches_float64(preprocessed, mode, config):
+    raw64, _, raw32, _ = preprocessed
+    filtered64 = filter_data(raw64.copy(), mode=mode, config=config)
+    filtered32 = filter_data(raw32.copy(), mode=mode, config=config)
+    assert filtered32._data.dtype == np.float32
+    assert _relative_error(filtered64._data, filtered32._data) < FILTER_TOLERANCE
+    assert filtered32.info["highpass"] == filtered64.info["highpass"]
+    assert filtered32.info["lowpass"] == filtered64.info["lowpass"]
+
+
+def test_filters_float32_skip_non_data_channels():
+    rng = np.random.default_rng(1)
+    n_times = int(SFREQ * 10)
+    stim = np.zeros(n_times)
+    stim[::512] = 1.0
+    info = mne.create_info(["C3", "C4", "STI"], SFREQ, ["eeg", "eeg", "stim"])
+    raw64 = mne.io.RawArray(
+        np.vstack([10e-6 * rng.standard_normal((2, n_times)), stim]), info, verbose="ERROR"
+    )
+    raw32 = raw64.copy().apply_function(lambda x: x, picks="all", dtype=np.float32)
+    config = {"highpass": 0.5, "lowpass": 30.0, "notch": [50.0]}
+    filtered64 = filter_data(raw64, mode="custom", config=config)
+    filtered32 = filter_data(raw32, mode="custom", config=config)
+    np.testing.assert_array_equal(filtered32._data[2], stim)
+    np.testing.assert_array_equal(filtered64._data[2], stim)
+    assert _relative_error(filtered64._data[:2], filtered32._data[:2]) < FILTER_TOLERANCE
+
+
+def test_chunk_read_float32_matches_float64(edf_path):
+    edf_info = chunk_manager.read_edf_info(edf_path)
+    chunk_info = chunk_manager.time_range(edf_info, 5.0, 25.0)
+    chunk64 = chunk_manager.get_chunk_data(edf_path, chunk_info, dtype="float64")
+    chunk32 = chunk_manager.get_chunk_data(edf_path, chunk_info, dtype="float32")
+    assert chunk32["data"].dtype == np.float32
+    assert chunk32["data"].shape == chunk64["data"].shape
+    assert _relative_error(chunk64["data"], chunk32["data"]) < CHUNK_TOLERANCE
+
+
+def test_features_float32_matches_float64(preprocessed):
+    raw64, _, raw32, _ = preprocessed
+    features64 = extract_features_from_signal(raw64._data[0], SFREQ, dtype="float64")
+    features32 = extract_features_from_signal(raw32._data[0], SFREQ, dtype="float32")
+    assert features64.keys() == features32.keys()
+    for name, value in features64.items():
+        assert features32[name] == pytest.approx(value, rel=FEATURE_TOLERANCE, abs=1e-6)
@@ -0,0 +1,39 @@
+"""Pirâmide de envelopes (min, max): níveis iguais a uma redução direta."""
+import numpy as np
+import pytest
+
+from app.core.pyramid import build_levels, count_levels, envelope, level_shapes, reduce_envelope
+
+
+def _direct_envelope(data: np.ndarray, bucket: int):
+    n_buckets = -(-data.shape[-1] // bucket)
+    mins = np.stack([data[..., i * bucket:(i + 1) * bucket].min(axis=-1) for i in range(n_buckets)], axis=-1)
+    maxs = np.stack([data[..., i * bucket:(i + 1) * bucket].max(axis=-1) for i in range(n_buckets)], axis=-1)
+    return mins, maxs
+
+
+@pytest.mark.parametrize("n_times", [1024, 1031, 4097])
+def test_build_levels_matches_direct_reduce(n_times, monkeypatch):
+    monkeypatch.setattr("app.core.pyramid.PYRAMID_MIN_BUCKETS", 16)
+    rng = np.random.default_rng(n_times)
+    samples = rng.standard_normal((3, n_times)).astype(np.float32)
+    n_levels = count_levels(n_times)
+    levels = [np.empty(shape, dtype=np.float32) for shape in level_shapes(3, n_times, n_levels)]
+    build_levels(samples, levels)
+
+    assert n_levels > 0
+    for level, pyramid in enumerate(levels, start=1):
+        expected_min, expected_max = _direct_envelope(samples, 2 ** level)
+        np.testing.assert_array_equal(pyramid[..., 0], expected_min)
+        np.testing.assert_array_equal(pyramid[..., 1], expected_max)
+
+
+def test_envelope_odd_length_keeps_last_sample():
+    data = np.array([3.0, -1.0, 4.0, 1.0, -5.0])
+    data_min, data_max = reduce_envelope(data, data)
+    np.testing.assert_array_equal(data_min, [-1.0, 1.0, -5.0])
+    np.testing.assert_array_equal(data_max, [3.0, 4.0, -5.0])
+
+    data_min, data_max = envelope(data, 2)
+    np.testing.assert_array_equal(data_min, [-1.0, -5.0])
+    np.testing.assert_array_equal(data_max, [4.0, -5.0])
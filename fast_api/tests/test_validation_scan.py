@@ -0,0 +1,54 @@
+"""Validação em blocos: média/variância combinadas (Welford/Chan) e detecções."""
+import numpy as np
+import pytest
+
+from app.core.preprocessing import _DataScan
+
+
+def _scan(data: np.ndarray, block: int, min_flat: int = 50) -> _DataScan:
+    scan = _DataScan(data.shape[0], min_flat)
+    for start in range(0, data.shape[1], block):
+        scan.update(data[:, start:start + block], start)
+    scan.finish()
+    return scan
+
+
+@pytest.mark.parametrize("block", [1, 7, 100, 1_000, 5_000])
+def test_block_merge_matches_numpy(block):
+    rng = np.random.default_rng(block)
+    # Offset DC grande para exercitar a estabilidade da combinação
+    data = rng.standard_normal((3, 4_321)) * [[1.0], [1e-6], [50.0]] + [[0.0], [1e-3], [1e4]]
+    scan = _scan(data, block)
+    np.testing.assert_allclose(scan.mean, data.mean(axis=1), rtol=1e-12)
+    np.testing.assert_allclose(scan.std() ** 2, data.var(axis=1), rtol=1e-9)
+
+
+def test_block_merge_float32_accumulates_in_float64():
+    rng = np.random.default_rng(0)
+    data = (rng.standard_normal((2, 100_000)) + 3.0).astype(np.float32)
+    scan = _scan(data, 2_560)
+    reference = data.astype(np.float64)
+    np.testing.assert_allclose(scan.mean, reference.mean(axis=1), rtol=1e-10)
+    np.testing.assert_allclose(scan.std() ** 2, reference.var(axis=1), rtol=1e-8)
+
+
+def test_nonfinite_ignored_in_stats_and_spans_cross_blocks():
+    rng = np.random.default_rng(1)
+    data = rng.standard_normal((2, 1_000))
+    data[1, 95:105] = np.nan
+    data[1, 500] = np.inf
+    scan = _scan(data, 100)
+
+    finite = data[1][np.isfinite(data[1])]
+    assert scan.nonfinite.tolist() == [0, 11]
+    assert scan.nonfinite_spans[1] == [[95, 105], [500, 501]]
+    np.testing.assert_allclose(scan.mean[1], finite.mean(), rtol=1e-12)
+    np.testing.assert_allclose(scan.std()[1] ** 2, finite.var(), rtol=1e-9)
+
+
+def test_flat_line_span_across_blocks():
+    rng = np.random.default_rng(2)
+    data = rng.standard_normal((1, 1_000))
+    data[0, 180:260] = 1.5
+    scan = _scan(data, 100, min_flat=50)
+    assert scan.flat_spans[0] == [[180, 260]]
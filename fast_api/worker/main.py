@@ -114,6 +114,7 @@ async def process_edf_metadata_only(file_path: str, patient_iid: str, session_na
         
         resp = await call_api("/api/edf-files/", payload)
         if resp and resp.status_code in [200, 201]:
+            # Overviews são agendados pela API quando a validação profunda termina
             logger.info(f"Metadata extracted successfully: {file_path}")
             return True
         else:
@@ -12,7 +12,10 @@ import { useRouter } from 'next/navigation'
 const formatStatus = (status) => {
   const statusMap = {
     new: 'Nova',
+    header_validated: 'Cabeçalho validado',
+    validating: 'Validando',
     validated: 'validada',
+    invalid: 'Inválida',
     processing: 'Processando',
     failed: 'Falhou',
     queued: 'Na Fila',
@@ -25,7 +28,10 @@ const getStatusColor = (status) => {
   const colorMap = {
     new: 'bg-blue-100 text-blue-800 dark:bg-blue-900/30 dark:text-blue-300',
     processing: 'bg-orange-100 text-orange-800 dark:bg-orange-900/30 dark:text-orange-300',
+    header_validated: 'bg-blue-100 text-blue-800 dark:bg-blue-900/30 dark:text-blue-300',
+    validating: 'bg-orange-100 text-orange-800 dark:bg-orange-900/30 dark:text-orange-300',
     validated: 'bg-green-100 text-green-800 dark:bg-green-900/30 dark:text-green-300',
+    invalid: 'bg-red-100 text-red-800 dark:bg-red-900/30 dark:text-red-300',
     failed: 'bg-red-100 text-red-800 dark:bg-red-900/30 dark:text-red-300',
     queued: 'bg-gray-100 text-gray-800 dark:bg-gray-900/30 dark:text-gray-300',
   }